@@ -3,6 +3,9 @@ ASGI config for app_site project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Required for the live status/leaderboard stream (``/api/events/``), e.g.
+``uvicorn app_site.asgi:application``. Under WSGI the pages fall back to polling.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -138,3 +138,68 @@ CALL_PASSCODE = 'naumur2025'
 # Fichiers médias (enregistrements audio)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Fichiers de MEDIA_ROOT servis tels quels en DEBUG ; le reste (enregistrements) passe par des vues authentifiées
+PUBLIC_MEDIA_FILES = ['logo.jpg']
+
+# Journal d'audit : écriture différée par lots (voir home/audit.py)
+AUDIT_LOG_ASYNC = True
+AUDIT_LOG_BATCH_SIZE = 200
+AUDIT_LOG_FLUSH_INTERVAL_MS = 500
+AUDIT_LOG_QUEUE_SIZE = 10000
+# Dernière activité des sessions : au plus une écriture par session et par intervalle (secondes)
+AUDIT_SESSION_TOUCH_INTERVAL = 60
+
+# Rétention du journal d'audit (voir home/retention.py et manage.py prune_audit)
+AUDIT_RETENTION_DAYS = 90
+AUDIT_PRUNE_BATCH_SIZE = 5000
+# Purge lancée par le worker `manage.py run_jobs` (un seul processus) toutes les N heures ;
+# None : purge planifiée en cron avec `manage.py prune_audit`
+AUDIT_PRUNE_EVERY_HOURS = None
+
+# Diffusion SSE (/api/events/, serveur ASGI requis) : battement de cœur et relève des compteurs
+EVENTS_SSE_ENABLED = True
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_POLL_SECONDS = 2
+EVENTS_QUEUE_SIZE = 100
+
+# Agrégats du tableau de bord : durée max en cache (secondes), invalidés à chaque appel/changement de statut
+DASHBOARD_STATS_TTL = 30
+
+# Import CSV des entreprises (voir home/importer.py) : taille des lots d'insertion et lignes prévisualisées
+IMPORT_BATCH_SIZE = 2000
+IMPORT_PREVIEW_ROWS = 50
+
+# Tâches de fond (imports/exports, voir home/jobs.py) exécutées par `manage.py run_jobs`
+JOBS_POLL_SECONDS = 2
+# Tâches « en cours » depuis plus longtemps : worker arrêté, remises en file au démarrage
+JOBS_STALE_MINUTES = 60
+# Tâches terminées et fichiers produits (PRIVATE_STORAGE_ROOT/jobs/) conservés
+JOBS_RETENTION_DAYS = 7
+# Fichiers des tâches (exports, CSV importés) : hors MEDIA_ROOT, jamais servis en statique,
+# téléchargés uniquement par /taches/<id>/telecharger/
+PRIVATE_STORAGE_ROOT = BASE_DIR / 'private'
+
+# Normalisation des téléphones (home/phones.py) : indicatif ajouté aux numéros nationaux
+PHONE_DEFAULT_COUNTRY_CODE = "237"
+PHONE_NATIONAL_DIGITS = 9
+
+# Envoi des enregistrements (/api/calls/<id>/recording/) : taille maximale d'un fichier audio (Mo)
+RECORDING_MAX_UPLOAD_MB = 200
+# Traitement des enregistrements (home/recordings.py) : processus du pool, débit Opus,
+# chemin de ffmpeg (None : recherche dans le PATH ; "" : durée seule, sans conversion)
+RECORDING_WORKERS = 2
+RECORDING_BITRATE = "24k"
+RECORDING_FFMPEG = None
+
+# Lecture des enregistrements (/enregistrements/<id>/, voir home/serving.py) :
+# "django" (FileResponse + Range), "nginx" (X-Accel-Redirect) ou "sendfile" (X-Sendfile)
+RECORDING_SERVE_MODE = "django"
+# Location Nginx `internal` pointant sur MEDIA_ROOT (mode "nginx")
+RECORDING_ACCEL_PREFIX = "/protected-media/"
+# Forme d'onde précalculée (fichier .peaks à côté de l'audio) : pics par seconde d'audio
+RECORDING_PEAKS_PER_SECOND = 20
+
+# Réservation des fiches ouvertes (home/claims.py) : durée du bail renouvelé par la page
+# d'appel, et intervalle minimal entre deux remises en file des baux expirés
+CLAIM_LEASE_SECONDS = 300
+CLAIM_SWEEP_SECONDS = 30
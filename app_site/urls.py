@@ -14,10 +14,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+from django.views.static import serve
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,4 +27,12 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Seuls les fichiers publics de MEDIA_ROOT (logo) : les enregistrements passent par
+    # /enregistrements/<id>/ et les fichiers des tâches par /taches/<id>/telecharger/
+    urlpatterns += [
+        re_path(
+            r"^%s(?P<path>%s)$" % (re.escape(settings.MEDIA_URL.lstrip("/")), "|".join(map(re.escape, settings.PUBLIC_MEDIA_FILES))),
+            serve,
+            {"document_root": settings.MEDIA_ROOT},
+        ),
+    ]
@@ -2,13 +2,19 @@ from django.contrib import admin
 from django.http import HttpResponse
 import csv
 
-from .models import AuditLog, CallRecord, Company, Recording, SessionSnapshot
+from . import changes, stats
+from .models import AuditLog, BackgroundJob, CallRecord, Company, Recording, SessionSnapshot
 
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
     list_display = ("name", "phone", "product", "status")
     search_fields = ("name", "phone", "product", "activity")
+    exclude = ("change_seq",)
+
+    def save_model(self, request, obj, form, change):
+        obj.change_seq = changes.next_seq()
+        super().save_model(request, obj, form, change)
 
 
 @admin.register(CallRecord)
@@ -17,13 +23,43 @@ class CallRecordAdmin(admin.ModelAdmin):
     search_fields = ("company__name", "user__username")
     list_filter = ("status_numero", "call_status")
 
+    # Écritures hors call_form : dernier appel et numéro de modification des
+    # entreprises concernées, compteurs des agents concernés, version des appels
+    def save_model(self, request, obj, form, change):
+        previous = CallRecord.objects.filter(pk=obj.pk).only("company_id", "user_id").first() if change else None
+        super().save_model(request, obj, form, change)
+        self._calls_changed([obj] + ([previous] if previous is not None else []))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self._calls_changed([obj])
+
+    def delete_queryset(self, request, queryset):
+        calls = list(queryset.only("company_id", "user_id"))
+        super().delete_queryset(request, queryset)
+        self._calls_changed(calls)
+
+    def _calls_changed(self, calls):
+        changes.refresh_companies(call.company_id for call in calls)
+        stats.rebuild_agent_stats(call.user_id for call in calls)
+        # Nouvelle version des appels : clé du cache du tableau de bord
+        changes.next_seq(changes.CALLS)
+
 
 @admin.register(Recording)
 class RecordingAdmin(admin.ModelAdmin):
-    list_display = ("call", "mime_type", "created_at")
+    list_display = ("call", "mime_type", "duration_seconds", "size_bytes", "bytes_saved", "created_at")
+    readonly_fields = ("original_size", "size_bytes", "processed_at")
     search_fields = ("call__company__name",)
 
 
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "progress", "total", "user", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+    readonly_fields = ("worker", "started_at", "finished_at")
+
+
 @admin.register(SessionSnapshot)
 class SessionSnapshotAdmin(admin.ModelAdmin):
     list_display = ("user", "session_key", "ip_address", "is_active", "login_at", "last_activity")
@@ -0,0 +1,295 @@
+"""
+Lecture des conteneurs audio et conversion par ffmpeg, sans Django.
+
+Les fonctions de ce module tournent dans les processus du pool de
+``recordings.py`` : pas d'accès à la base, uniquement des chemins de fichiers.
+La durée est lue directement dans le conteneur (WebM/Matroska, MP4 classique
+ou fragmenté, Ogg) en ne chargeant que les en-têtes.
+"""
+from __future__ import annotations
+
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+from array import array
+from typing import Optional
+
+OUTPUT_EXT = "ogg"
+OUTPUT_MIME = "audio/ogg"
+
+# Éléments EBML (Matroska/WebM) utiles à la durée
+_EBML_SEGMENT = 0x18538067
+_EBML_INFO = 0x1549A966
+_EBML_CLUSTER = 0x1F43B675
+_EBML_BLOCK_GROUP = 0xA0
+_EBML_TIMECODE_SCALE = 0x2AD7B1
+_EBML_DURATION = 0x4489
+_EBML_CLUSTER_TIMECODE = 0xE7
+_EBML_SIMPLE_BLOCK = 0xA3
+_EBML_BLOCK = 0xA1
+_EBML_MASTERS = {_EBML_SEGMENT, _EBML_INFO, _EBML_CLUSTER, _EBML_BLOCK_GROUP}
+
+# Boîtes MP4 parcourues (les autres sont sautées)
+_MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"mvex", b"moof", b"traf"}
+
+OGG_TAIL_BYTES = 64 * 1024
+
+# Forme d'onde : en-tête (magie, pics par seconde) puis un octet (0-255) par pic
+PEAKS_MAGIC = b"PEAK"
+_PEAKS_HEADER = struct.Struct("<4sH")
+PEAKS_SAMPLE_RATE = 8000
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """Durée en secondes lue dans le conteneur ; ``None`` si format inconnu ou fichier illisible."""
+    try:
+        with open(path, "rb") as fh:
+            head = fh.read(12)
+            fh.seek(0)
+            if head.startswith(b"\x1aE\xdf\xa3"):
+                return _webm_duration(fh)
+            if head[4:8] == b"ftyp":
+                return _mp4_duration(fh)
+            if head.startswith(b"OggS"):
+                return _ogg_duration(fh)
+    except (OSError, ValueError, struct.error, IndexError):
+        pass
+    return None
+
+
+def _uint(data: bytes) -> int:
+    return int.from_bytes(data, "big") if data else 0
+
+
+def _read_vint(fh, keep_marker: bool):
+    """Entier EBML à longueur variable : (valeur, taille inconnue) ou (None, False) en fin de fichier."""
+    first = fh.read(1)
+    if not first:
+        return None, False
+    length = 1
+    mask = 0x80
+    while not first[0] & mask:
+        mask >>= 1
+        length += 1
+        if length > 8:
+            raise ValueError("vint EBML invalide")
+    rest = fh.read(length - 1)
+    if len(rest) < length - 1:
+        return None, False
+    value = first[0] if keep_marker else first[0] & (mask - 1)
+    for byte in rest:
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, unknown
+
+
+def _webm_duration(fh) -> Optional[float]:
+    scale = 1_000_000  # TimecodeScale par défaut : 1 ms
+    duration = None
+    cluster_ts = 0
+    last_ts = 0
+    while True:
+        el_id, _ = _read_vint(fh, keep_marker=True)
+        if el_id is None:
+            break
+        el_size, unknown = _read_vint(fh, keep_marker=False)
+        if el_size is None:
+            break
+        if el_id in _EBML_MASTERS:
+            # Info lue avant le premier cluster : la durée déclarée suffit
+            if el_id == _EBML_CLUSTER and duration:
+                break
+            continue
+        if unknown:
+            break
+        if el_id == _EBML_TIMECODE_SCALE:
+            scale = _uint(fh.read(el_size)) or scale
+        elif el_id == _EBML_DURATION:
+            data = fh.read(el_size)
+            duration = struct.unpack(">f" if el_size == 4 else ">d", data)[0]
+        elif el_id == _EBML_CLUSTER_TIMECODE:
+            cluster_ts = _uint(fh.read(el_size))
+        elif el_id in (_EBML_SIMPLE_BLOCK, _EBML_BLOCK):
+            # Numéro de piste (vint) puis horodatage relatif au cluster (int16)
+            data = fh.read(min(el_size, 12))
+            track_len = 1
+            while track_len <= 8 and not data[0] & (0x80 >> (track_len - 1)):
+                track_len += 1
+            (relative,) = struct.unpack(">h", data[track_len:track_len + 2])
+            last_ts = max(last_ts, cluster_ts + relative)
+            fh.seek(el_size - len(data), os.SEEK_CUR)
+        else:
+            fh.seek(el_size, os.SEEK_CUR)
+    # Chrome n'écrit pas de Duration : dernier bloc à défaut
+    ticks = duration if duration else last_ts
+    return ticks * scale / 1e9 if ticks else None
+
+
+def _mp4_duration(fh) -> Optional[float]:
+    end = os.fstat(fh.fileno()).st_size
+    movie_scale = movie_duration = 0
+    media_scale = 0
+    fragments = 0
+    default_sample = 0
+    while fh.tell() + 8 <= end:
+        size, kind = struct.unpack(">I4s", fh.read(8))
+        body = size - 8
+        if size == 1:
+            body = struct.unpack(">Q", fh.read(8))[0] - 16
+        elif size == 0:
+            body = end - fh.tell()
+        if kind in _MP4_CONTAINERS:
+            continue
+        data = fh.read(min(body, 1 << 20)) if kind in (b"mvhd", b"mehd", b"mdhd", b"tfhd", b"trun") else b""
+        fh.seek(body - len(data), os.SEEK_CUR)
+        version = data[0] if data else 0
+        if kind == b"mvhd":
+            if version == 1:
+                movie_scale, movie_duration = struct.unpack(">IQ", data[20:32])
+            else:
+                movie_scale, movie_duration = struct.unpack(">II", data[12:20])
+        elif kind == b"mehd" and not movie_duration:
+            movie_duration = _uint(data[4:12] if version == 1 else data[4:8])
+        elif kind == b"mdhd":
+            media_scale = struct.unpack(">I", data[20:24] if version == 1 else data[12:16])[0]
+        elif kind == b"tfhd":
+            flags = _uint(data[1:4])
+            offset = 8 + (8 if flags & 0x1 else 0) + (4 if flags & 0x2 else 0)
+            if flags & 0x8:
+                default_sample = struct.unpack(">I", data[offset:offset + 4])[0]
+        elif kind == b"trun":
+            fragments += _trun_duration(data, default_sample)
+    if movie_scale and movie_duration:
+        return movie_duration / movie_scale
+    # MP4 fragmenté (MediaRecorder) : somme des échantillons des fragments
+    if media_scale and fragments:
+        return fragments / media_scale
+    return None
+
+
+def _trun_duration(data: bytes, default_sample: int) -> int:
+    flags = _uint(data[1:4])
+    (count,) = struct.unpack(">I", data[4:8])
+    if not flags & 0x100:
+        return count * default_sample
+    pos = 8 + (4 if flags & 0x1 else 0) + (4 if flags & 0x4 else 0)
+    stride = 4 * sum(1 for bit in (0x100, 0x200, 0x400, 0x800) if flags & bit)
+    total = 0
+    for _ in range(count):
+        total += struct.unpack(">I", data[pos:pos + 4])[0]
+        pos += stride
+    return total
+
+
+def _ogg_duration(fh) -> Optional[float]:
+    head = fh.read(512)
+    if b"OpusHead" in head:
+        rate = 48000
+        start = head.index(b"OpusHead")
+        (pre_skip,) = struct.unpack("<H", head[start + 10:start + 12])
+    elif b"\x01vorbis" in head:
+        start = head.index(b"\x01vorbis")
+        (rate,) = struct.unpack("<I", head[start + 12:start + 16])
+        pre_skip = 0
+    else:
+        return None
+    size = os.fstat(fh.fileno()).st_size
+    fh.seek(max(0, size - OGG_TAIL_BYTES))
+    tail = fh.read()
+    pos = tail.rfind(b"OggS")
+    if pos < 0 or not rate:
+        return None
+    # Position (granule) de la dernière page = nombre d'échantillons
+    (granule,) = struct.unpack("<q", tail[pos + 6:pos + 14])
+    return max(0, granule - pre_skip) / rate
+
+
+def transcode(src: str, dst: str, ffmpeg: str, bitrate: str) -> None:
+    """Convertit en Opus mono bas débit (profil voix)."""
+    subprocess.run(
+        [
+            ffmpeg, "-nostdin", "-loglevel", "error", "-y", "-i", src,
+            "-vn", "-ac", "1", "-c:a", "libopus", "-b:a", bitrate, "-application", "voip",
+            dst,
+        ],
+        check=True,
+        capture_output=True,
+        timeout=600,
+    )
+
+
+def compute_peaks(path: str, ffmpeg: str, per_second: int = 20) -> Optional[bytes]:
+    """
+    Forme d'onde compacte : amplitude maximale de chaque fenêtre de
+    ``1/per_second`` s, décodée par ffmpeg en PCM 8 kHz mono lu au fil de l'eau.
+    ``None`` sans ffmpeg ou si le décodage échoue.
+    """
+    if not ffmpeg:
+        return None
+    window = 2 * max(1, PEAKS_SAMPLE_RATE // per_second)
+    proc = subprocess.Popen(
+        [
+            ffmpeg, "-nostdin", "-loglevel", "error", "-i", path,
+            "-vn", "-ac", "1", "-ar", str(PEAKS_SAMPLE_RATE), "-f", "s16le", "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    peaks = bytearray()
+    pending = b""
+    try:
+        for chunk in iter(lambda: proc.stdout.read(64 * 1024), b""):
+            pending += chunk
+            usable = len(pending) - len(pending) % window
+            for offset in range(0, usable, window):
+                peaks.append(_peak(pending[offset:offset + window]))
+            pending = pending[usable:]
+        if len(pending) >= 2:
+            peaks.append(_peak(pending[: len(pending) - len(pending) % 2]))
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        return None
+    return _PEAKS_HEADER.pack(PEAKS_MAGIC, per_second) + bytes(peaks)
+
+
+def _peak(pcm: bytes) -> int:
+    samples = array("h", pcm)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return min(255, max(max(samples), -min(samples)) * 255 // 32767)
+
+
+def read_peaks(data: bytes) -> tuple[int, bytes]:
+    """(pics par seconde, pics) d'un fichier produit par ``compute_peaks``."""
+    magic, per_second = _PEAKS_HEADER.unpack_from(data)
+    if magic != PEAKS_MAGIC:
+        raise ValueError("Fichier de forme d'onde invalide")
+    return per_second, data[_PEAKS_HEADER.size:]
+
+
+def process_file(path: str, ffmpeg: str = "", bitrate: str = "24k", peaks_per_second: int = 20) -> dict:
+    """
+    Exécuté dans un processus du pool : convertit ``path`` si ffmpeg est
+    disponible et que le résultat est plus petit, puis mesure la durée et
+    calcule la forme d'onde (``compute_peaks``).
+    ``output`` est un fichier temporaire à reprendre (et supprimer) par l'appelant.
+    """
+    result = {"original_size": os.path.getsize(path), "output": "", "duration": None}
+    if ffmpeg:
+        fd, output = tempfile.mkstemp(suffix=f".{OUTPUT_EXT}")
+        os.close(fd)
+        try:
+            transcode(path, output, ffmpeg, bitrate)
+            if 0 < os.path.getsize(output) < result["original_size"]:
+                result["output"] = output
+        except (OSError, subprocess.SubprocessError):
+            pass
+        if not result["output"]:
+            os.remove(output)
+    result["duration"] = probe_duration(result["output"] or path)
+    result["peaks"] = compute_peaks(result["output"] or path, ffmpeg, peaks_per_second)
+    return result
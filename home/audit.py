@@ -0,0 +1,258 @@
+"""
+Écriture asynchrone du journal d'audit.
+
+Le middleware dépose les événements dans une file bornée ; un thread
+d'arrière-plan les insère par lots (``bulk_create``) dès que
+``AUDIT_LOG_BATCH_SIZE`` événements sont en attente ou toutes les
+``AUDIT_LOG_FLUSH_INTERVAL_MS`` millisecondes. Si la file est pleine,
+l'événement est abandonné et compté plutôt que de bloquer la requête.
+
+Le même thread reporte la dernière activité des sessions
+(``SessionActivityTracker``) : au plus une écriture par session toutes les
+``AUDIT_SESSION_TOUCH_INTERVAL`` secondes, en un seul UPDATE groupé.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, DateTimeField, GenericIPAddressField, IntegerField, TextField, Value, When
+from django.utils import timezone
+
+from . import metrics
+from .models import AuditLog, SessionSnapshot
+
+# Limite de variables SQLite pour les clauses IN / CASE
+_SQL_CHUNK = 400
+
+
+class SessionActivityTracker:
+    """Dernière activité par clé de session, écrite en base par intervalles."""
+
+    def __init__(self, interval_seconds: float = 60):
+        self.interval = interval_seconds
+        self._lock = threading.Lock()
+        self._pending: dict[str, dict] = {}
+        self._written: dict[str, float] = {}
+
+    def touch(self, session_key: str, user_id, ip_address, user_agent: str) -> None:
+        with self._lock:
+            self._pending[session_key] = {
+                "user_id": user_id,
+                "ip_address": ip_address,
+                "user_agent": user_agent,
+                "last_activity": timezone.now(),
+            }
+
+    def discard(self, session_key: str) -> None:
+        with self._lock:
+            self._pending.pop(session_key, None)
+            self._written.pop(session_key, None)
+
+    def flush(self, force: bool = False) -> int:
+        """Écrit les sessions dont le dernier report date de plus de ``interval``."""
+        now = time.monotonic()
+        with self._lock:
+            due = {
+                key: entry
+                for key, entry in self._pending.items()
+                if force or now - self._written.get(key, float("-inf")) >= self.interval
+            }
+            for key in due:
+                del self._pending[key]
+                self._written[key] = now
+            self._written = {k: t for k, t in self._written.items() if now - t < self.interval or k in self._pending}
+        if not due:
+            return 0
+        try:
+            keys = list(due)
+            for start in range(0, len(keys), _SQL_CHUNK):
+                self._write({key: due[key] for key in keys[start:start + _SQL_CHUNK]})
+            metrics.incr("sessions.flushed", len(due))
+        except Exception:
+            metrics.incr("sessions.failed", len(due))
+        return len(due)
+
+    @staticmethod
+    def _write(entries: dict[str, dict]) -> None:
+        existing = set(
+            SessionSnapshot.objects.filter(session_key__in=entries).values_list("session_key", flat=True)
+        )
+        missing = [
+            SessionSnapshot(
+                session_key=key,
+                user_id=entry["user_id"],
+                ip_address=entry["ip_address"],
+                user_agent=entry["user_agent"],
+                login_at=entry["last_activity"],
+                last_activity=entry["last_activity"],
+                is_active=True,
+            )
+            for key, entry in entries.items()
+            if key not in existing
+        ]
+        if missing:
+            SessionSnapshot.objects.bulk_create(missing, ignore_conflicts=True)
+        if existing:
+            # Utilisateur, IP et navigateur suivent la session ; une session de nouveau active est rouverte
+            SessionSnapshot.objects.filter(session_key__in=existing).update(
+                is_active=True,
+                **{
+                    field: Case(
+                        *[When(session_key=key, then=Value(entries[key][field], output_field=output)) for key in existing],
+                        output_field=output,
+                    )
+                    for field, output in (
+                        ("user_id", IntegerField()),
+                        ("ip_address", GenericIPAddressField()),
+                        ("user_agent", TextField()),
+                        ("last_activity", DateTimeField()),
+                    )
+                },
+            )
+
+
+class AuditLogWriter:
+    def __init__(self, batch_size: int = 200, flush_interval_ms: int = 500, max_queue: int = 10000, use_thread: bool = True,
+                 session_interval: float = 60):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(1, flush_interval_ms) / 1000
+        self.use_thread = use_thread
+        self.sessions = SessionActivityTracker(session_interval)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    @classmethod
+    def from_settings(cls) -> "AuditLogWriter":
+        return cls(
+            batch_size=getattr(settings, "AUDIT_LOG_BATCH_SIZE", 200),
+            flush_interval_ms=getattr(settings, "AUDIT_LOG_FLUSH_INTERVAL_MS", 500),
+            max_queue=getattr(settings, "AUDIT_LOG_QUEUE_SIZE", 10000),
+            use_thread=getattr(settings, "AUDIT_LOG_ASYNC", True),
+            session_interval=getattr(settings, "AUDIT_SESSION_TOUCH_INTERVAL", 60),
+        )
+
+    def enqueue(self, entry: AuditLog) -> bool:
+        """Dépose un ``AuditLog`` non sauvegardé ; ne bloque jamais."""
+        if not self.use_thread:
+            self._write([entry])
+            return True
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            metrics.incr("audit.dropped")
+            return False
+        return True
+
+    def touch_session(self, session_key: str, user_id, ip_address, user_agent: str) -> None:
+        self.sessions.touch(session_key, user_id, ip_address, user_agent)
+        if self.use_thread:
+            self._ensure_started()
+        else:
+            self.sessions.flush()
+
+    def flush(self) -> int:
+        """Vide la file immédiatement dans le thread appelant."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+        self.sessions.flush(force=True)
+        return self._queue.qsize()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def _ensure_started(self) -> None:
+        # Un processus forké (gunicorn, runserver) hérite de l'objet mais pas du thread.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        batch: list[AuditLog] = []
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stop.is_set():
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            if len(batch) >= self.batch_size or (batch and now >= deadline):
+                self._write(batch)
+                batch = []
+                close_old_connections()
+            if now >= deadline:
+                if self.sessions.flush():
+                    close_old_connections()
+                deadline = now + self.flush_interval
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch: list[AuditLog]) -> None:
+        try:
+            AuditLog.objects.bulk_create(batch, batch_size=self.batch_size)
+            metrics.incr("audit.flushed", len(batch))
+            metrics.incr("audit.batches")
+        except Exception:
+            metrics.incr("audit.failed", len(batch))
+
+
+_writer: Optional[AuditLogWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> AuditLogWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditLogWriter.from_settings()
+                atexit.register(_writer.stop)
+    return _writer
+
+
+def record(**fields) -> bool:
+    """Ajoute une entrée au journal d'audit (écriture différée)."""
+    fields.setdefault("created_at", timezone.now())
+    return get_writer().enqueue(AuditLog(**fields))
+
+
+def touch_session(session_key: str, user_id, ip_address, user_agent: str) -> None:
+    """Note l'activité d'une session ; la ligne ``SessionSnapshot`` suit en différé."""
+    get_writer().touch_session(session_key, user_id, ip_address, user_agent)
+
+
+def forget_session(session_key: str) -> None:
+    get_writer().sessions.discard(session_key)
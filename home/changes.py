@@ -0,0 +1,106 @@
+"""
+Séquence de modifications des entreprises.
+
+Chaque changement de statut ou d'inspecteur reçoit un numéro croissant
+(``Company.change_seq``). Les clients qui interrogent ``company_statuses``
+renvoient le dernier numéro reçu et n'obtiennent que les lignes modifiées
+depuis.
+"""
+from __future__ import annotations
+
+from typing import Callable, Optional
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+from .models import CallRecord, ChangeCounter, Company
+
+COMPANIES = "companies"
+CALLS = "calls"
+
+# Appelés après le commit de toute modification (ex. réveil du diffuseur SSE)
+listeners: list[Callable[[], None]] = []
+
+
+def next_seq(name: str = COMPANIES) -> int:
+    """Incrémente et retourne le compteur ``name`` (atomique)."""
+    with transaction.atomic():
+        if not ChangeCounter.objects.filter(name=name).update(value=F("value") + 1):
+            ChangeCounter.objects.get_or_create(name=name)
+            ChangeCounter.objects.filter(name=name).update(value=F("value") + 1)
+        transaction.on_commit(_notify_listeners)
+        return ChangeCounter.objects.values_list("value", flat=True).get(name=name)
+
+
+def current_seq(name: str = COMPANIES) -> int:
+    value = ChangeCounter.objects.filter(name=name).values_list("value", flat=True).first()
+    return value or 0
+
+
+def save_status(company: Company, status: str, latest_call: Optional[CallRecord] = None) -> int:
+    """
+    Change le statut d'une entreprise et lui attribue un nouveau numéro de
+    modification ; ``latest_call`` met à jour le dernier appel dans la même écriture.
+    Quitter « En cours » libère le bail de l'agent (claims.py).
+    """
+    update_fields = ["status", "change_seq"]
+    with transaction.atomic():
+        company.status = status
+        if status != "in_progress":
+            company.claimed_by = None
+            company.claim_expires_at = None
+            company.claim_prev_status = ""
+            update_fields += ["claimed_by", "claim_expires_at", "claim_prev_status"]
+        if latest_call is not None:
+            company.latest_call = latest_call
+            update_fields.append("latest_call")
+        company.change_seq = next_seq()
+        company.save(update_fields=update_fields)
+    return company.change_seq
+
+
+def refresh_latest_calls(company_ids=None) -> int:
+    """Recalcule ``Company.latest_call`` en un seul UPDATE (toutes les entreprises par défaut)."""
+    companies = Company.objects.all()
+    if company_ids is not None:
+        companies = companies.filter(id__in=company_ids)
+    return companies.update(
+        latest_call=Subquery(
+            CallRecord.objects.filter(company=OuterRef("pk")).order_by("-created_at", "-id").values("id")[:1]
+        )
+    )
+
+
+def refresh_companies(company_ids) -> None:
+    """
+    Après modification ou suppression d'appels hors ``call_form`` (admin) :
+    recalcule leur dernier appel et attribue un nouveau numéro aux entreprises.
+    """
+    company_ids = [pk for pk in set(company_ids) if pk is not None]
+    if not company_ids:
+        return
+    with transaction.atomic():
+        refresh_latest_calls(company_ids)
+        Company.objects.filter(id__in=company_ids).update(change_seq=next_seq())
+
+
+def company_status_rows(since: Optional[int] = None) -> list[dict]:
+    """Statut et inspecteur des entreprises, limités à celles modifiées après ``since``."""
+    companies = Company.objects.values("id", "status", "latest_call__user__username").order_by("id")
+    if since is not None:
+        companies = companies.filter(change_seq__gt=since)
+    labels = dict(Company.STATUS_CHOICES)
+    return [
+        {
+            "id": c["id"],
+            "status": c["status"],
+            "status_display": labels.get(c["status"], c["status"]),
+            "inspector": c["latest_call__user__username"],
+        }
+        for c in companies
+    ]
+
+
+def _notify_listeners() -> None:
+    for listener in listeners:
+        listener()
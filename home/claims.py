@@ -0,0 +1,105 @@
+"""
+Réservation atomique d'une entreprise par l'agent qui ouvre sa fiche.
+
+``claim`` passe la fiche « En cours » par un UPDATE conditionnel
+(``status IN ('pending', 'callback')`` ou bail expiré) et lit le nombre de
+lignes modifiées : deux agents ne peuvent pas obtenir la même entreprise. Le
+bail dure ``CLAIM_LEASE_SECONDS`` et la page d'appel le renouvelle tant
+qu'elle est ouverte (échéance seule, sans nouveau numéro de modification) ; ``sweep_expired`` rend en un
+seul UPDATE les fiches abandonnées à leur statut précédent.
+"""
+from __future__ import annotations
+
+import datetime
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from . import changes, metrics
+from .models import Company
+
+CLAIMABLE = ("pending", "callback")
+
+_sweep_lock = threading.Lock()
+_next_sweep = 0.0
+
+
+def lease_seconds() -> int:
+    return getattr(settings, "CLAIM_LEASE_SECONDS", 300)
+
+
+def claim(company_id: int, user) -> bool:
+    """Réserve (ou prolonge) l'entreprise pour ``user`` ; False si un autre agent la détient."""
+    started = time.monotonic()
+    now = timezone.now()
+    expires_at = now + datetime.timedelta(seconds=lease_seconds())
+    # Renouvellement par le détenteur : ni statut ni agent ne changent, pas de nouveau numéro
+    claimed = Company.objects.filter(id=company_id, status="in_progress", claimed_by=user).update(claim_expires_at=expires_at)
+    if not claimed:
+        available = (
+            Q(status__in=CLAIMABLE)
+            | Q(status="in_progress", claim_expires_at__lt=now)
+            # Fiches « En cours » d'avant les baux : sans échéance, donc reprenables
+            | Q(status="in_progress", claim_expires_at__isnull=True)
+        )
+        with transaction.atomic():
+            claimed = Company.objects.filter(available, id=company_id).update(
+                status="in_progress",
+                claimed_by=user,
+                claim_expires_at=expires_at,
+                # Statut rendu à l'expiration : celui d'avant la première réservation
+                claim_prev_status=Case(When(status="in_progress", then=F("claim_prev_status")), default=F("status")),
+            )
+            if claimed:
+                Company.objects.filter(id=company_id).update(change_seq=changes.next_seq())
+    metrics.observe("claims.latency_ms", (time.monotonic() - started) * 1000)
+    metrics.incr("claims.granted" if claimed else "claims.conflicts")
+    return bool(claimed)
+
+
+def _restore(companies) -> int:
+    with transaction.atomic():
+        return companies.update(
+            status=Case(When(claim_prev_status="", then=Value("pending")), default=F("claim_prev_status")),
+            claimed_by=None,
+            claim_expires_at=None,
+            claim_prev_status="",
+            change_seq=changes.next_seq(),
+        )
+
+
+def release(company_id: int, user) -> bool:
+    """Rend la fiche si ``user`` la détient encore (page d'appel quittée sans valider)."""
+    companies = Company.objects.filter(id=company_id, status="in_progress", claimed_by=user)
+    if not companies.exists():
+        return False
+    released = _restore(companies)
+    metrics.incr("claims.released", released)
+    return bool(released)
+
+
+def sweep_expired() -> int:
+    """Rend à leur statut précédent toutes les fiches dont le bail a expiré."""
+    expired = Company.objects.filter(status="in_progress", claim_expires_at__lt=timezone.now())
+    if not expired.exists():
+        return 0
+    swept = _restore(expired)
+    metrics.incr("claims.expired", swept)
+    return swept
+
+
+def sweep_if_due(interval: Optional[float] = None) -> int:
+    """``sweep_expired`` au plus une fois par ``interval`` secondes et par processus."""
+    global _next_sweep
+    interval = interval if interval is not None else getattr(settings, "CLAIM_SWEEP_SECONDS", 30)
+    with _sweep_lock:
+        now = time.monotonic()
+        if now < _next_sweep:
+            return 0
+        _next_sweep = now + interval
+    return sweep_expired()
@@ -0,0 +1,141 @@
+"""
+Diffusion en direct (Server-Sent Events) des statuts et du classement.
+
+Un seul diffuseur par processus : un thread surveille les compteurs de
+``changes`` (réveillé immédiatement après chaque commit local, sinon toutes
+les ``EVENTS_POLL_SECONDS`` pour les modifications faites par d'autres
+processus) et pousse le delta à toutes les connexions ouvertes. Le coût ne
+dépend donc plus du nombre d'onglets. Nécessite un serveur ASGI
+(``app_site.asgi``) ; sous WSGI les pages reviennent au polling.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import changes, metrics, stats
+
+logger = logging.getLogger(__name__)
+
+TOPICS = ("companies", "users")
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, topics: set[str], max_queue: int):
+        self.loop = loop
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+
+    def put(self, message: str) -> None:
+        # Exécuté dans la boucle de la connexion ; un client trop lent perd les plus anciens messages.
+        if self.queue.full():
+            self.queue.get_nowait()
+            metrics.incr("events.dropped")
+        self.queue.put_nowait(message)
+
+
+class Broadcaster:
+    def __init__(self, poll_seconds: float = 2.0, max_queue: int = 100):
+        self.poll_seconds = poll_seconds
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers: set[Subscription] = set()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, topics: set[str]) -> Subscription:
+        """À appeler depuis la boucle asyncio de la connexion."""
+        sub = Subscription(asyncio.get_running_loop(), topics, self.max_queue)
+        with self._lock:
+            self._subscribers.add(sub)
+            metrics.set_value("events.connections", len(self._subscribers))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._watch, name="events-broadcaster", daemon=True)
+                self._thread.start()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+            metrics.set_value("events.connections", len(self._subscribers))
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def has_subscribers(self, topic: str) -> bool:
+        with self._lock:
+            return any(topic in sub.topics for sub in self._subscribers)
+
+    def publish(self, topic: str, data) -> int:
+        message = format_event(topic, data)
+        with self._lock:
+            targets = [sub for sub in self._subscribers if topic in sub.topics]
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub.put, message)
+            except RuntimeError:
+                # Boucle fermée : la connexion est partie
+                self.unsubscribe(sub)
+        metrics.incr("events.published")
+        return len(targets)
+
+    def _watch(self) -> None:
+        companies_seq = calls_seq = None
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            self._wake.clear()
+            try:
+                seq = changes.current_seq(changes.COMPANIES)
+                if companies_seq is not None and seq > companies_seq and self.has_subscribers("companies"):
+                    rows = changes.company_status_rows(since=companies_seq)
+                    self.publish("companies", {"cursor": seq, "companies": rows})
+                companies_seq = seq
+                seq = changes.current_seq(changes.CALLS)
+                if calls_seq is not None and seq > calls_seq and self.has_subscribers("users"):
+                    self.publish("users", {"users": stats.user_cards()})
+                calls_seq = seq
+            except Exception:
+                logger.exception("Diffusion SSE échouée")
+            finally:
+                close_old_connections()
+            self._wake.wait(self.poll_seconds)
+
+
+broadcaster = Broadcaster(
+    poll_seconds=getattr(settings, "EVENTS_POLL_SECONDS", 2.0),
+    max_queue=getattr(settings, "EVENTS_QUEUE_SIZE", 100),
+)
+changes.listeners.append(broadcaster.wake)
+
+
+async def stream(topics: set[str], since: Optional[int], heartbeat: float):
+    """Corps de la réponse SSE : rattrapage depuis ``since`` puis événements diffusés."""
+    sub = broadcaster.subscribe(topics)
+    try:
+        yield f"retry: {int(heartbeat * 1000)}\n\n"
+        if "companies" in topics and since is not None:
+            cursor = await sync_to_async(changes.current_seq)()
+            if cursor > since:
+                rows = await sync_to_async(changes.company_status_rows)(since)
+                yield format_event("companies", {"cursor": cursor, "companies": rows})
+        while True:
+            try:
+                yield await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+    finally:
+        broadcaster.unsubscribe(sub)
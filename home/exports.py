@@ -0,0 +1,165 @@
+"""
+Export consolidé des appels.
+
+Les lignes sont lues par paquets (``.iterator(chunk_size=...)``) et
+encodées au fil de l'eau : la mémoire reste stable quel que soit le nombre
+d'appels et le premier octet part immédiatement.
+
+``read_filters``/``filter_calls`` sont partagés par l'aperçu paginé et le
+téléchargement. Pour les extractions incrémentales (BI), ``since`` est un
+id d'appel : seuls les appels plus récents sont exportés, par id croissant,
+et ``export_snapshot`` renvoie le curseur à passer à l'extraction suivante.
+
+``export_row`` renvoie des valeurs typées (date, nombre) : le CSV/TSV les
+formate en texte, le XLSX (``home.xlsx``) les écrit en cellules typées.
+"""
+from __future__ import annotations
+
+import csv
+import datetime
+import io
+from typing import Iterable, Iterator, Optional
+
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import xlsx
+from .models import CallRecord
+
+EXPORT_HEADER = [
+    "Nom de l'entreprise", "Téléphone", "Produit", "Activité", "Localisation",
+    "Régime/Forme", "NIU", "Validité score", "Statut numéros", "Statut appel",
+    "Présentation", "Questions libres", "Questions orientées", "Enquête",
+    "Date-temps", "Enregistrement vocal",
+]
+
+CHUNK_SIZE = 2000
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+FILTER_PARAMS = ("date_from", "date_to", "agent", "product", "status")
+
+
+def export_queryset():
+    return CallRecord.objects.select_related("company", "user").with_audio_flag().order_by("-created_at")
+
+
+def read_filters(params) -> dict:
+    """Filtres valides lus dans ``params`` (GET/POST) ; les valeurs invalides sont ignorées."""
+    filters = {}
+    for key in ("date_from", "date_to"):
+        try:
+            value = parse_date(params.get(key, "").strip())
+        except ValueError:
+            value = None
+        if value:
+            filters[key] = value
+    agent = params.get("agent", "").strip()
+    if agent.isdigit():
+        filters["agent"] = int(agent)
+    product = params.get("product", "").strip()
+    if product:
+        filters["product"] = product
+    status = params.get("status", "").strip()
+    if status in dict(CallRecord.CALL_STATUS_CHOICES):
+        filters["status"] = status
+    return filters
+
+
+def _day_start(day: datetime.date) -> datetime.datetime:
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def filter_calls(queryset, filters: dict):
+    """Applique les filtres de ``read_filters`` (bornes de dates incluses, sur ``created_at``)."""
+    if "date_from" in filters:
+        queryset = queryset.filter(created_at__gte=_day_start(filters["date_from"]))
+    if "date_to" in filters:
+        queryset = queryset.filter(created_at__lt=_day_start(filters["date_to"] + datetime.timedelta(days=1)))
+    if "agent" in filters:
+        queryset = queryset.filter(user_id=filters["agent"])
+    if "product" in filters:
+        queryset = queryset.filter(company__product=filters["product"])
+    if "status" in filters:
+        queryset = queryset.filter(call_status=filters["status"])
+    return queryset
+
+
+def read_since(params) -> Optional[int]:
+    since = params.get("since", "").strip()
+    return int(since) if since.isdigit() else None
+
+
+def export_snapshot(filters: dict, since: Optional[int] = None) -> tuple:
+    """
+    Appels à exporter, figés à l'id maximal courant, et curseur de la prochaine extraction.
+
+    Le curseur est cet id maximal : les appels créés pendant le
+    téléchargement partiront à l'extraction suivante, sans doublon ni trou.
+    """
+    high_water = CallRecord.objects.aggregate(last=Max("id"))["last"] or 0
+    queryset = filter_calls(export_queryset(), filters).filter(id__lte=high_water)
+    if since is not None:
+        queryset = queryset.filter(id__gt=since).order_by("id")
+    return queryset, max(high_water, since or 0)
+
+
+def export_row(call: CallRecord) -> list:
+    """Ligne d'export ; ``call`` doit venir d'un queryset ``with_audio_flag()``."""
+    c = call.company
+    return [
+        c.name,
+        c.phone,
+        c.product,
+        c.activity,
+        c.location,
+        c.legal_form,
+        c.niu,
+        c.validity_score,
+        call.get_status_numero_display(),
+        call.get_call_status_display() if call.call_status else "",
+        call.get_presentation_level_display() if call.presentation_level else "",
+        call.get_questions_libres_level_display() if call.questions_libres_level else "",
+        call.get_questions_orientees_level_display() if call.questions_orientees_level else "",
+        call.enquete_status(),
+        timezone.localtime(call.status_marked_at or call.created_at).replace(tzinfo=None),
+        "Oui" if call.has_audio else "Non",
+    ]
+
+
+def iter_rows(queryset=None, chunk_size: int = CHUNK_SIZE) -> Iterator[list]:
+    queryset = export_queryset() if queryset is None else queryset
+    for call in queryset.iterator(chunk_size=chunk_size):
+        yield export_row(call)
+
+
+def _text(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime(DATE_FORMAT)
+    return value
+
+
+def iter_delimited(rows: Iterable[list], delimiter: str = ",", rows_per_chunk: int = 500) -> Iterator[bytes]:
+    """Encode en-tête + lignes en CSV/TSV UTF-8, par blocs de ``rows_per_chunk`` lignes."""
+    buffer = io.StringIO(newline="")
+    writer = csv.writer(buffer, delimiter=delimiter)
+    writer.writerow(EXPORT_HEADER)
+    # L'en-tête part seul pour que le téléchargement démarre avant la première requête
+    yield buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate(0)
+    pending = 0
+    for row in rows:
+        writer.writerow([_text(value) for value in row])
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_xlsx(rows: Iterable[list], rows_per_chunk: int = 500) -> Iterator[bytes]:
+    """Classeur XLSX en flux : dates en dates, score de validité en nombre."""
+    return xlsx.iter_xlsx(EXPORT_HEADER, rows, sheet_name="Appels", rows_per_chunk=rows_per_chunk)
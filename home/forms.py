@@ -4,10 +4,8 @@ from .models import CallRecord
 
 
 class CallRecordForm(forms.ModelForm):
-    recording_data = forms.CharField(required=False, widget=forms.HiddenInput())
     recording_started = forms.BooleanField(required=False, widget=forms.HiddenInput())
     skip_without_rec = forms.BooleanField(required=False, widget=forms.HiddenInput())
-    recording_mime = forms.CharField(required=False, widget=forms.HiddenInput())
     questionnaire_data = forms.JSONField(required=False, widget=forms.HiddenInput())
 
     class Meta:
@@ -19,10 +17,8 @@ class CallRecordForm(forms.ModelForm):
             "questions_libres_level",
             "questions_orientees_level",
             "status_marked_at",
-            "recording_data",
             "recording_started",
             "skip_without_rec",
-            "recording_mime",
             "questionnaire_data",
         ]
         widgets = {
@@ -0,0 +1,348 @@
+"""
+Import CSV des entreprises en deux temps.
+
+1. ``stage_upload`` lit le fichier par morceaux (``UploadedFile.chunks()``),
+   le décode au fil de l'eau et écrit les lignes normalisées dans la table
+   de préparation ``CompanyImportRow`` par ``bulk_create`` groupés. Seul
+   l'identifiant de l'import transite par la session et le formulaire.
+2. ``apply_merge`` (par défaut) rapproche chaque ligne d'une entreprise
+   existante par ``niu``, à défaut par téléphone normalisé, met à jour les champs
+   modifiés et crée les nouvelles (les lignes sans NIU ni téléphone sont
+   rejetées) : l'historique d'appels est conservé et le coût dépend du
+   fichier, pas de la table. ``apply_replace`` remplace toute
+   la base (et, en cascade, les appels).
+
+Une même entreprise (numéro normalisé et NIU identiques, ou NIU absent des
+deux côtés) présente plusieurs fois dans le fichier n'est importée qu'une
+fois : les lignes suivantes sont marquées à la préparation et écartées à la
+confirmation. Deux NIU différents derrière un même standard restent deux
+entreprises.
+
+Les deux étapes tournent dans le worker (``jobs.py``) et acceptent un
+rappel ``progress(lignes_traitées)``.
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+import datetime
+from itertools import chain
+from typing import Iterator
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import changes, stats
+from .phones import normalize_phone
+from .models import Company, CompanyImport, CompanyImportRow
+
+# Téléphone par défaut des lignes sans numéro (clé normalisée vide, jamais rapprochée)
+MISSING_PHONE = "Non renseigne"
+# Champs mis à jour en fusion ; le statut suit la campagne d'appels et n'est pas écrasé.
+# Une valeur vide ou par défaut du fichier ne remplace jamais la valeur existante.
+MERGE_FIELDS = ["name", "phone", "phone_key", "product", "activity", "location", "legal_form", "niu", "validity_score"]
+
+IMPORT_FIELDS = MERGE_FIELDS + ["status"]
+
+# En-têtes reconnus par champ, et position utilisée pour un fichier sans en-tête
+COLUMNS = [
+    ("name", ["name", "Name", "nom", "Nom"]),
+    ("phone", ["phone", "Phone", "tel", "Tel", "Telephone", "Téléphone"]),
+    ("product", ["product", "Product", "filiere", "Produit", "produit", "filières"]),
+    ("activity", ["activity", "Activity", "Activité"]),
+    ("location", ["location", "Location", "Localisation"]),
+    ("legal_form", ["legal_form", "Legal_form", "forme"]),
+    ("niu", ["niu", "NIU"]),
+    ("validity_score", ["validity_score", "score"]),
+    ("status", ["status", "etat"]),
+]
+
+SNIFF_BYTES = 64 * 1024
+
+
+def batch_size() -> int:
+    return getattr(settings, "IMPORT_BATCH_SIZE", 2000)
+
+
+def _iter_lines(uploaded_file, encoding: str) -> Iterator[str]:
+    """Lignes du fichier (fin de ligne conservée), décodées morceau par morceau."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    for chunk in uploaded_file.chunks():
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _sniff(lines: Iterator[str]) -> tuple[Iterator[str], str, bool]:
+    """Délimiteur et présence d'en-tête d'après les 5 premières lignes non vides."""
+    head = []
+    size = 0
+    for line in lines:
+        head.append(line)
+        size += len(line)
+        if sum(1 for h in head if h.strip()) >= 5 or size >= SNIFF_BYTES:
+            break
+    sample_lines = [line.rstrip("\r\n") for line in head if line.strip()][:5]
+    delimiter = ","
+    if sample_lines:
+        comma_score = sum(line.count(",") for line in sample_lines)
+        semicolon_score = sum(line.count(";") for line in sample_lines)
+        delimiter = ";" if semicolon_score > comma_score else ","
+    try:
+        has_header = csv.Sniffer().has_header("\n".join(sample_lines)) if sample_lines else True
+    except Exception:
+        has_header = True
+    return chain(head, lines), delimiter, has_header
+
+
+def _trim(val, limit=255):
+    return str(val)[:limit] if val is not None else ""
+
+
+def parse_row(row, idx: int) -> dict:
+    """Normalise une ligne CSV (dict si en-tête, liste sinon) en champs ``Company``."""
+    values = {}
+    for position, (field, keys) in enumerate(COLUMNS):
+        value = ""
+        if isinstance(row, dict):
+            for k in keys:
+                if k in row and row[k] not in (None, ""):
+                    value = row[k]
+                    break
+        elif position < len(row):
+            value = row[position]
+        values[field] = value
+
+    # ``None`` : colonne absente, vide ou illisible (0 à la création, ignorée en fusion)
+    try:
+        validity_score = float(values["validity_score"]) if values["validity_score"] not in ("", None) else None
+    except ValueError:
+        validity_score = None
+    status = _trim(values["status"]) or "pending"
+    if status not in dict(Company.STATUS_CHOICES):
+        status = "pending"
+    return {
+        "name": _trim(values["name"]) or f"Entreprise {idx}",
+        "phone": _trim(values["phone"]) or MISSING_PHONE,
+        "phone_key": normalize_phone(_trim(values["phone"])),
+        "product": _trim(values["product"]),
+        "activity": _trim(values["activity"]),
+        "location": _trim(values["location"]),
+        "legal_form": _trim(values["legal_form"]),
+        "niu": _trim(values["niu"]),
+        "validity_score": validity_score,
+        "status": status,
+    }
+
+
+def _stage(batch: CompanyImport, uploaded_file, encoding: str, progress=None) -> tuple[int, int]:
+    """Lignes écrites et doublons ; un couple (numéro, NIU) déjà vu dans le fichier (table de hachage) est marqué ``duplicate_of``."""
+    lines, delimiter, has_header = _sniff(_iter_lines(uploaded_file, encoding))
+    reader = csv.DictReader(lines, delimiter=delimiter) if has_header else csv.reader(lines, delimiter=delimiter)
+    size = batch_size()
+    seen: dict[tuple[str, str], int] = {}
+    pending = []
+    count = duplicates = 0
+    for row in reader:
+        if not row:
+            continue
+        count += 1
+        values = parse_row(row, count)
+        key = (values["phone_key"], values["niu"])
+        duplicate_of = seen.setdefault(key, count) if values["phone_key"] else count
+        if duplicate_of != count:
+            duplicates += 1
+        pending.append(
+            CompanyImportRow(batch=batch, line=count, duplicate_of=None if duplicate_of == count else duplicate_of, **values)
+        )
+        if len(pending) >= size:
+            CompanyImportRow.objects.bulk_create(pending)
+            pending = []
+            if progress:
+                progress(count)
+    if pending:
+        CompanyImportRow.objects.bulk_create(pending)
+    if progress:
+        progress(count)
+    return count, duplicates
+
+
+def stage_upload(uploaded_file, user=None, filename: str = "", progress=None) -> CompanyImport:
+    """
+    Écrit le fichier dans la table de préparation (UTF-8, sinon Latin-1).
+
+    Chaque lot est validé séparément pour que l'avancement reste visible ;
+    en cas d'échec l'import est supprimé.
+    """
+    discard_stale()
+    batch = CompanyImport.objects.create(
+        user=user if user is not None and user.is_authenticated else None,
+        filename=_trim(filename or getattr(uploaded_file, "name", "")),
+    )
+    try:
+        try:
+            count, duplicates = _stage(batch, uploaded_file, "utf-8-sig", progress)
+        except UnicodeDecodeError:
+            batch.rows.all().delete()
+            uploaded_file.seek(0)
+            count, duplicates = _stage(batch, uploaded_file, "latin-1", progress)
+    except Exception:
+        batch.delete()
+        raise
+    batch.row_count = count
+    batch.duplicate_count = duplicates
+    batch.save(update_fields=["row_count", "duplicate_count"])
+    return batch
+
+
+def preview_rows(batch: CompanyImport, limit: int) -> list[dict]:
+    return list(batch.rows.order_by("line").values("line", "duplicate_of", *IMPORT_FIELDS)[:limit])
+
+
+def duplicate_rows(batch: CompanyImport, limit: int) -> list[dict]:
+    return list(
+        batch.rows.filter(duplicate_of__isnull=False).order_by("line").values("line", "duplicate_of", "phone")[:limit]
+    )
+
+
+def staged_chunks(batch: CompanyImport) -> Iterator[list[dict]]:
+    """
+    Lignes préparées par paquets de ``batch_size()``, relues par clé (``line``)
+    sans curseur ouvert (``line`` incluse). Les doublons (numéro et NIU) sont écartés.
+    """
+    size = batch_size()
+    last = 0
+    while True:
+        rows = list(batch.rows.filter(line__gt=last, duplicate_of__isnull=True).order_by("line").values("line", *IMPORT_FIELDS)[:size])
+        if not rows:
+            return
+        last = rows[-1]["line"]
+        yield rows
+
+
+def _new_company(row: dict, seq: int) -> Company:
+    values = {field: row[field] for field in IMPORT_FIELDS}
+    if values["validity_score"] is None:
+        values["validity_score"] = 0
+    return Company(**values, change_seq=seq)
+
+
+def _merge_values(row: dict) -> dict:
+    """Champs de la ligne à reporter sur une entreprise existante : ni vides ni valeurs par défaut."""
+    placeholders = {"name": f"Entreprise {row['line']}", "phone": MISSING_PHONE}
+    return {
+        field: row[field]
+        for field in MERGE_FIELDS
+        if row[field] not in ("", None) and row[field] != placeholders.get(field)
+    }
+
+
+def apply_replace(batch: CompanyImport, progress=None) -> int:
+    """Remplace toutes les entreprises (et, en cascade, leurs appels) par l'import, en une transaction."""
+    size = batch_size()
+    count = 0
+    with transaction.atomic():
+        Company.objects.all().delete()
+        seq = changes.next_seq()
+        for rows in staged_chunks(batch):
+            Company.objects.bulk_create([_new_company(row, seq) for row in rows], batch_size=size)
+            count += len(rows)
+            if progress:
+                progress(count)
+        # Les appels des anciennes entreprises ont été supprimés en cascade
+        stats.rebuild_agent_stats()
+        changes.next_seq(changes.CALLS)
+        batch.delete()
+    return count
+
+
+def _match(row: dict, by_niu: dict, by_phone: dict):
+    """Entreprise existante par NIU, à défaut par téléphone normalisé (sauf si elle porte un autre NIU)."""
+    company = by_niu.get(row["niu"]) if row["niu"] else None
+    if company is None and row["phone_key"]:
+        company = by_phone.get(row["phone_key"])
+        if company is not None and row["niu"] and company.niu and company.niu != row["niu"]:
+            return None
+    return company
+
+
+def _merge_chunk(rows: list[dict], size: int, report: dict) -> None:
+    nius = {row["niu"] for row in rows if row["niu"]}
+    phone_keys = {row["phone_key"] for row in rows if row["phone_key"]}
+    by_niu, by_phone = {}, {}
+    if nius:
+        for company in Company.objects.filter(niu__in=nius).order_by("id"):
+            by_niu.setdefault(company.niu, company)
+    if phone_keys:
+        for company in Company.objects.filter(phone_key__in=phone_keys).order_by("id"):
+            by_phone.setdefault(company.phone_key, company)
+
+    to_create, to_update = [], {}
+    for row in rows:
+        if not row["niu"] and not row["phone_key"]:
+            # Sans NIU ni numéro, rien ne permet de la retrouver : la réimporter la dupliquerait
+            report["rejected"] += 1
+            continue
+        company = _match(row, by_niu, by_phone)
+        if company is None:
+            company = _new_company(row, 0)
+            to_create.append(company)
+            # Une même clé répétée dans le fichier met à jour la ligne créée juste avant
+            if row["niu"]:
+                by_niu[row["niu"]] = company
+            if row["phone_key"]:
+                by_phone.setdefault(row["phone_key"], company)
+            continue
+        changed = False
+        for field, raw in _merge_values(row).items():
+            value = Company._meta.get_field(field).to_python(raw)
+            if getattr(company, field) != value:
+                setattr(company, field, value)
+                changed = True
+        if changed and company.pk is not None:
+            to_update[company.pk] = company
+        elif not changed and company.pk is not None and company.pk not in to_update:
+            report["unchanged"] += 1
+
+    # Lectures hors transaction : sous SQLite, une transaction qui lit avant
+    # d'écrire échoue aussitôt (« database is locked ») si un autre écrivain passe.
+    with transaction.atomic():
+        # Numéro pris dans la transaction du paquet : les clients qui relisent
+        # depuis leur dernier numéro voient ces lignes une fois validées
+        seq = changes.next_seq()
+        for company in chain(to_create, to_update.values()):
+            company.change_seq = seq
+        Company.objects.bulk_create(to_create, batch_size=size)
+        Company.objects.bulk_update(list(to_update.values()), MERGE_FIELDS + ["change_seq"], batch_size=size)
+    report["inserted"] += len(to_create)
+    report["updated"] += len(to_update)
+
+
+def apply_merge(batch: CompanyImport, progress=None) -> dict:
+    """
+    Fusionne l'import dans la base ; renvoie les nombres de lignes insérées,
+    mises à jour, inchangées et rejetées (sans NIU ni téléphone). Chaque paquet est validé séparément : un
+    import interrompu peut simplement être relancé.
+    """
+    size = batch_size()
+    report = {"inserted": 0, "updated": 0, "unchanged": 0, "rejected": 0}
+    done = 0
+    for rows in staged_chunks(batch):
+        _merge_chunk(rows, size, report)
+        done += len(rows)
+        if progress:
+            progress(done)
+    batch.delete()
+    return report
+
+
+def discard_stale(hours: int = 24) -> None:
+    """Supprime les imports jamais confirmés."""
+    CompanyImport.objects.filter(created_at__lt=timezone.now() - datetime.timedelta(hours=hours)).delete()
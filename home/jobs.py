@@ -0,0 +1,184 @@
+"""
+File de tâches en base pour les imports, exports et traitements audio longs.
+
+Les vues créent une ``BackgroundJob`` (``enqueue``) et rendent la main ; le
+worker ``manage.py run_jobs`` la réserve par un UPDATE conditionnel (plusieurs
+workers possibles, sans verrou ni broker externe), exécute le gestionnaire
+enregistré pour son ``kind`` et publie l'avancement en base. Les fichiers
+produits et les CSV envoyés sont rangés dans le stockage privé
+(``PRIVATE_STORAGE_ROOT/jobs/``), hors ``MEDIA_ROOT``.
+"""
+from __future__ import annotations
+
+import datetime
+import logging
+import tempfile
+import time
+from typing import Callable, Optional
+
+from django.core.files import File
+from django.db import connection
+from django.utils import timezone
+
+from . import exports, importer, metrics, recordings
+from .models import BackgroundJob, CompanyImport
+from .storage import private_storage
+
+logger = logging.getLogger(__name__)
+
+handlers: dict[str, Callable] = {}
+
+
+def handler(kind: str):
+    def register(func):
+        handlers[kind] = func
+        return func
+
+    return register
+
+
+def enqueue(kind: str, params: Optional[dict] = None, user=None) -> BackgroundJob:
+    job = BackgroundJob.objects.create(
+        kind=kind,
+        params=params or {},
+        user=user if user is not None and user.is_authenticated else None,
+    )
+    metrics.incr("jobs.queued")
+    return job
+
+
+def enqueue_once(kind: str, params: Optional[dict] = None, user=None) -> BackgroundJob:
+    """Comme ``enqueue``, sauf si une tâche ``kind`` attend déjà : elle traitera aussi ce travail."""
+    queued = BackgroundJob.objects.filter(kind=kind, status="queued").order_by("id").first()
+    return queued or enqueue(kind, params, user)
+
+
+def claim_next(worker: str) -> Optional[BackgroundJob]:
+    """Réserve la plus ancienne tâche en attente ; ``None`` si la file est vide."""
+    candidates = BackgroundJob.objects.filter(status="queued").order_by("id").values_list("id", flat=True)[:10]
+    for job_id in candidates:
+        claimed = BackgroundJob.objects.filter(id=job_id, status="queued").update(
+            status="running", worker=worker[:64], started_at=timezone.now()
+        )
+        if claimed:
+            return BackgroundJob.objects.get(id=job_id)
+    return None
+
+
+class Progress:
+    """Avancement d'une tâche, écrit en base au plus une fois par ``interval`` secondes."""
+
+    def __init__(self, job: BackgroundJob, interval: float = 1.0):
+        self.job = job
+        self.interval = interval
+        self._written = 0.0
+
+    def __call__(self, done: int, total: Optional[int] = None) -> None:
+        self.job.progress = done
+        if total is not None:
+            self.job.total = total
+        now = time.monotonic()
+        # Dans une transaction, l'écriture ne serait visible qu'au commit : inutile
+        if now - self._written < self.interval or connection.in_atomic_block:
+            return
+        self._written = now
+        BackgroundJob.objects.filter(id=self.job.id).update(progress=self.job.progress, total=self.job.total)
+
+
+def run(job: BackgroundJob) -> BackgroundJob:
+    started = time.monotonic()
+    try:
+        func = handlers.get(job.kind)
+        if func is None:
+            raise ValueError(f"Type de tâche inconnu : {job.kind}")
+        job.result = func(job, Progress(job)) or {}
+        job.status = "done"
+    except Exception as exc:
+        logger.exception("Tâche %s échouée", job.id)
+        job.status = "failed"
+        job.message = str(exc)[:1000]
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "progress", "total", "message", "result", "result_file", "finished_at"])
+    metrics.incr(f"jobs.{job.status}")
+    metrics.observe("jobs.duration_ms", (time.monotonic() - started) * 1000)
+    return job
+
+
+def requeue_stale(minutes: int) -> int:
+    """Remet en file les tâches restées « en cours » (worker arrêté brutalement)."""
+    cutoff = timezone.now() - datetime.timedelta(minutes=minutes)
+    return BackgroundJob.objects.filter(status="running", started_at__lt=cutoff).update(status="queued", worker="")
+
+
+def prune(days: int) -> int:
+    """Supprime les tâches terminées plus anciennes que ``days`` et leurs fichiers."""
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    old = BackgroundJob.objects.filter(status__in=["done", "failed"], finished_at__lt=cutoff)
+    for job in old.exclude(result_file=""):
+        job.result_file.delete(save=False)
+    return old.delete()[0]
+
+
+def as_dict(job: BackgroundJob) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "status_label": job.get_status_display(),
+        "progress": job.progress,
+        "total": job.total,
+        "message": job.message,
+        "result": job.result,
+        "has_file": bool(job.result_file),
+    }
+
+
+def _counted(rows, progress: Progress, total: int):
+    for done, row in enumerate(rows, start=1):
+        if done % 1000 == 0:
+            progress(done, total)
+        yield row
+
+
+@handler("export")
+def export_job(job: BackgroundJob, progress: Progress) -> dict:
+    params = job.params
+    queryset, cursor = exports.export_snapshot(exports.read_filters(params), exports.read_since(params))
+    total = queryset.count()
+    progress(0, total)
+    rows = _counted(exports.iter_rows(queryset), progress, total)
+    excel = params.get("format") == "excel"
+    chunks = exports.iter_xlsx(rows) if excel else exports.iter_delimited(rows)
+    filename = f"{params.get('filename') or 'export'}.{'xlsx' if excel else 'csv'}"
+    with tempfile.TemporaryFile() as tmp:
+        for chunk in chunks:
+            tmp.write(chunk)
+        tmp.seek(0)
+        job.result_file.save(f"{job.id}/{filename}", File(tmp), save=False)
+    progress(total, total)
+    return {"rows": total, "cursor": cursor, "filename": filename}
+
+
+@handler("import_stage")
+def import_stage_job(job: BackgroundJob, progress: Progress) -> dict:
+    path = job.params["upload"]
+    try:
+        with private_storage.open(path, "rb") as upload:
+            batch = importer.stage_upload(upload, user=job.user, filename=job.params.get("filename", ""), progress=progress)
+    finally:
+        private_storage.delete(path)
+    return {"batch": batch.id, "rows": batch.row_count}
+
+
+@handler("import_apply")
+def import_apply_job(job: BackgroundJob, progress: Progress) -> dict:
+    batch = CompanyImport.objects.get(id=job.params["batch"])
+    progress(0, batch.row_count)
+    if job.params.get("mode") == "replace":
+        return {"mode": "replace", "inserted": importer.apply_replace(batch, progress)}
+    return {"mode": "merge", **importer.apply_merge(batch, progress)}
+
+
+@handler("recordings")
+def recordings_job(job: BackgroundJob, progress: Progress) -> dict:
+    return recordings.process_pending(progress)
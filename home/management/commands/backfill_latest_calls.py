@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from home.changes import refresh_latest_calls
+
+
+class Command(BaseCommand):
+    help = "Recalcule le dernier appel de chaque entreprise (Company.latest_call)."
+
+    def handle(self, *args, **options):
+        updated = refresh_latest_calls()
+        self.stdout.write(self.style.SUCCESS(f"{updated} entreprises mises à jour."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from home import phones
+from home.models import Company
+
+
+class Command(BaseCommand):
+    help = "Recalcule le téléphone normalisé (phone_key) de toutes les entreprises."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000, help="Entreprises relues par paquet.")
+
+    def handle(self, *args, **options):
+        count = phones.backfill(Company, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{count} numéros normalisés mis à jour."))
@@ -0,0 +1,45 @@
+import datetime
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from home import exports
+
+
+def synthetic_rows(count: int):
+    """Lignes au format de ``exports.export_row``, sans passer par la base."""
+    start = datetime.datetime(2024, 1, 1, 8, 0)
+    for i in range(count):
+        yield [
+            f"Entreprise {i}", f"6{i:08d}", "Produit A", "Commerce", "Douala", "SARL", f"M{i:012d}",
+            Decimal("7.5"), "Répond", "Accepté", "Complet", "Partiel", "Complet", "Complet",
+            start + datetime.timedelta(minutes=i), "Oui" if i % 3 else "Non",
+        ]
+
+
+class Command(BaseCommand):
+    help = "Compare l'export TSV et l'export XLSX (durée, taille, pic mémoire) sur des lignes synthétiques."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000, help="Nombre de lignes générées.")
+
+    def handle(self, *args, **options):
+        count = options["rows"]
+        encoders = {
+            "TSV": lambda rows: exports.iter_delimited(rows, delimiter="\t"),
+            "XLSX": exports.iter_xlsx,
+        }
+        for name, encode in encoders.items():
+            tracemalloc.start()
+            started = time.perf_counter()
+            size = sum(len(chunk) for chunk in encode(synthetic_rows(count)))
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(
+                f"{name:<5} {count} lignes : {elapsed:.2f} s, {size / 1_048_576:.1f} Mo, "
+                f"pic mémoire {peak / 1024:.0f} Kio"
+            )
+        self.stdout.write(self.style.SUCCESS("Benchmark terminé."))
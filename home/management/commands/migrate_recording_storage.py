@@ -0,0 +1,41 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from home.models import Recording
+from home.storage import content_hash_of
+
+
+class Command(BaseCommand):
+    help = "Range les anciens enregistrements (dossier plat recordings/) dans le stockage adressé par contenu."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Enregistrements relus par paquet.")
+
+    def handle(self, *args, **options):
+        moved = missing = 0
+        last = 0
+        while True:
+            batch = list(
+                Recording.objects.filter(id__gt=last, content_hash="").exclude(file="").order_by("id")[: options["batch_size"]]
+            )
+            if not batch:
+                break
+            last = batch[-1].id
+            for recording in batch:
+                storage = recording.file.storage
+                old_name = recording.file.name
+                if content_hash_of(old_name):
+                    # Déjà rangé (empreinte absente en base seulement)
+                    recording.save(update_fields=["content_hash"])
+                    continue
+                if not storage.exists(old_name):
+                    missing += 1
+                    continue
+                with storage.open(old_name, "rb") as fh:
+                    recording.file.save(old_name.rsplit("/", 1)[-1], File(fh), save=False)
+                recording.save(update_fields=["file", "content_hash"])
+                storage.delete_if_unused(old_name, Recording)
+                moved += 1
+        if missing:
+            self.stdout.write(f"{missing} fichiers introuvables laissés tels quels.")
+        self.stdout.write(self.style.SUCCESS(f"{moved} enregistrements déplacés."))
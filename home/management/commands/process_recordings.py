@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from home import recordings
+
+
+class Command(BaseCommand):
+    help = "Convertit les enregistrements non traités (Opus si ffmpeg est présent) et renseigne leur durée."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Processus de conversion (défaut : RECORDING_WORKERS).")
+        parser.add_argument(
+            "--waveforms",
+            action="store_true",
+            help="Calcule aussi la forme d'onde des enregistrements déjà traités qui n'en ont pas.",
+        )
+
+    def handle(self, *args, **options):
+        if not recordings.ffmpeg_binary():
+            self.stdout.write("ffmpeg introuvable : durée seule, fichiers conservés tels quels.")
+        report = recordings.process_pending(workers=options["workers"])
+        if options["waveforms"]:
+            self.stdout.write(f"{recordings.backfill_peaks(options['workers'])} formes d'onde calculées.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{report['processed']} enregistrements traités, {report['bytes_saved'] / 1048576:.1f} Mo gagnés."
+            )
+        )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from home.retention import prune_audit
+
+
+class Command(BaseCommand):
+    help = "Supprime par lots les journaux d'audit et sessions plus anciens que la rétention."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "AUDIT_RETENTION_DAYS", 90),
+            help="Rétention en jours (défaut : AUDIT_RETENTION_DAYS).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "AUDIT_PRUNE_BATCH_SIZE", 5000),
+            help="Nombre de clés primaires couvertes par chaque DELETE.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Pause (secondes) entre deux lots pour laisser passer les écritures.",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] <= 0 or options["batch_size"] <= 0:
+            self.stderr.write("--days et --batch-size doivent être positifs.")
+            return
+        result = prune_audit(options["days"], options["batch_size"], options["pause"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result['audit_logs']} journaux et {result['sessions']} sessions supprimés "
+                f"(rétention {options['days']} jours)."
+            )
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from home.stats import rebuild_agent_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs d'appels par agent (AgentStats) depuis l'historique."
+
+    def handle(self, *args, **options):
+        count = rebuild_agent_stats()
+        self.stdout.write(self.style.SUCCESS(f"Compteurs recalculés pour {count} agents."))
@@ -0,0 +1,68 @@
+import logging
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from home import claims, jobs, retention
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Worker des tâches d'import/export en attente (BackgroundJob) ; à laisser tourner à côté du serveur."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Traite les tâches en attente puis s'arrête.")
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=getattr(settings, "JOBS_POLL_SECONDS", 2),
+            help="Pause (secondes) entre deux relèves quand la file est vide.",
+        )
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        requeued = jobs.requeue_stale(getattr(settings, "JOBS_STALE_MINUTES", 60))
+        if requeued:
+            self.stdout.write(f"{requeued} tâches interrompues remises en file.")
+        retention_days = getattr(settings, "JOBS_RETENTION_DAYS", 7)
+        next_prune = 0.0
+        audit_every = getattr(settings, "AUDIT_PRUNE_EVERY_HOURS", None)
+        next_audit_prune = time.monotonic() + audit_every * 3600 if audit_every else None
+        processed = 0
+        try:
+            while True:
+                close_old_connections()
+                # Fiches « En cours » abandonnées (bail expiré) rendues à leur statut
+                self._periodic(claims.sweep_if_due)
+                if time.monotonic() >= next_prune:
+                    self._periodic(jobs.prune, retention_days)
+                    next_prune = time.monotonic() + 3600
+                if next_audit_prune is not None and time.monotonic() >= next_audit_prune:
+                    self._periodic(retention.prune_audit)
+                    next_audit_prune = time.monotonic() + audit_every * 3600
+                job = jobs.claim_next(worker)
+                if job is None:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll"])
+                    continue
+                self.stdout.write(f"Tâche {job.id} ({job.kind}) démarrée.")
+                job = jobs.run(job)
+                processed += 1
+                self.stdout.write(f"Tâche {job.id} : {job.get_status_display()}.")
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"{processed} tâches traitées."))
+
+    def _periodic(self, task, *args):
+        # Un échec (base verrouillée, disque plein…) est journalisé sans arrêter
+        # le worker : la file des tâches et les baux continuent d'être traités
+        try:
+            task(*args)
+        except Exception:
+            logger.exception("Tâche périodique %s en échec", task.__name__)
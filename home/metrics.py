@@ -0,0 +1,35 @@
+"""
+Compteurs de fonctionnement en mémoire (un jeu par processus).
+
+Utilisés pour suivre le journal d'audit, les caches et les verrous d'appel
+sans dépendre d'un outil externe. Exposés en JSON via ``api/metrics/``.
+"""
+from __future__ import annotations
+
+import threading
+
+_lock = threading.Lock()
+_values: dict[str, float] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        _values[name] = _values.get(name, 0) + value
+
+
+def set_value(name: str, value: float) -> None:
+    with _lock:
+        _values[name] = value
+
+
+def observe(name: str, value: float) -> None:
+    """Enregistre une mesure (nombre, total, max) sous ``name``."""
+    with _lock:
+        _values[f"{name}.count"] = _values.get(f"{name}.count", 0) + 1
+        _values[f"{name}.total"] = _values.get(f"{name}.total", 0) + value
+        _values[f"{name}.max"] = max(_values.get(f"{name}.max", 0), value)
+
+
+def snapshot() -> dict[str, float]:
+    with _lock:
+        return dict(sorted(_values.items()))
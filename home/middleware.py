@@ -1,20 +1,17 @@
 from __future__ import annotations
 
 import time
-from typing import Optional
 
-from django.utils import timezone
-
-from .models import AuditLog, SessionSnapshot
+from . import audit
 
 
 class AuditLogMiddleware:
     """
     Enregistre les requêtes (user, IP, session, user-agent, URL, code, durée)
     et met à jour la dernière activité de la session.
-    """
 
-    _last_prune: Optional[float] = None
+    Les entrées du journal sont écrites en différé par ``audit.AuditLogWriter``.
+    """
 
     def __init__(self, get_response):
         self.get_response = get_response
@@ -52,7 +49,7 @@ class AuditLogMiddleware:
         status_code = getattr(response, "status_code", 0) if response else 0
         payload_summary = self._summarize_payload(request)
 
-        AuditLog.objects.create(
+        audit.record(
             user=user_obj,
             session_key=session_key,
             ip_address=ip_addr,
@@ -64,21 +61,9 @@ class AuditLogMiddleware:
             payload_summary=payload_summary[:4000],
         )
 
-        # Maj activité session
+        # Maj activité session (coalescée, voir audit.SessionActivityTracker)
         if session_key:
-            SessionSnapshot.objects.update_or_create(
-                session_key=session_key,
-                defaults={
-                    "user": user_obj,
-                    "ip_address": ip_addr,
-                    "user_agent": user_agent[:1024],
-                    "last_activity": timezone.now(),
-                    "login_at": timezone.now(),
-                    "is_active": True,
-                },
-            )
-
-        self._prune_old_logs()
+            audit.touch_session(session_key, user_obj.pk if user_obj else None, ip_addr, user_agent[:1024])
 
     @staticmethod
     def _get_ip(request):
@@ -96,12 +81,3 @@ class AuditLogMiddleware:
             keys = list(request.GET.keys())
             return f"GET keys={keys}"
         return ""
-
-    def _prune_old_logs(self):
-        now = time.time()
-        if self._last_prune and now - self._last_prune < 6 * 3600:
-            return
-        cutoff = timezone.now() - timezone.timedelta(days=90)
-        AuditLog.objects.filter(created_at__lt=cutoff).delete()
-        SessionSnapshot.objects.filter(last_activity__lt=cutoff).delete()
-        self._last_prune = now
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0008_alter_auditlog_created_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="company",
+            name="change_seq",
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.CreateModel(
+            name="ChangeCounter",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=32, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_latest_call(apps, schema_editor):
+    Company = apps.get_model("home", "Company")
+    CallRecord = apps.get_model("home", "CallRecord")
+    Company.objects.update(
+        latest_call=Subquery(
+            CallRecord.objects.filter(company=OuterRef("pk")).order_by("-created_at", "-id").values("id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0009_company_change_seq_changecounter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="company",
+            name="latest_call",
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="+", to="home.callrecord"),
+        ),
+        migrations.AddIndex(
+            model_name="callrecord",
+            index=models.Index(fields=["company", "-created_at"], name="home_callre_company_9ea0fa_idx"),
+        ),
+        migrations.RunPython(backfill_latest_call, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0010_company_latest_call"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(fields=["status", "name", "id"], name="home_compan_status_54d259_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(fields=["product"], name="home_compan_product_59e67a_idx"),
+        ),
+    ]
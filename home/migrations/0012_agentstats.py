@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def build_agent_stats(apps, schema_editor):
+    AgentStats = apps.get_model("home", "AgentStats")
+    CallRecord = apps.get_model("home", "CallRecord")
+    complete = (
+        Q(call_status="accepted")
+        & ~Q(presentation_level="")
+        & ~Q(questions_libres_level="")
+        & ~Q(questions_orientees_level="")
+    )
+    rows = (
+        CallRecord.objects.filter(user__isnull=False)
+        .values("user_id")
+        .annotate(total=Count("id"), complete=Count("id", filter=complete))
+        .order_by()
+    )
+    AgentStats.objects.bulk_create(
+        AgentStats(
+            user_id=row["user_id"],
+            total=row["total"],
+            complete=row["complete"],
+            incomplete=row["total"] - row["complete"],
+            points=2 * row["complete"] + (row["total"] - row["complete"]),
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("home", "0011_company_list_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AgentStats",
+            fields=[
+                ("user", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name="agent_stats", serialize=False, to=settings.AUTH_USER_MODEL)),
+                ("total", models.PositiveIntegerField(default=0)),
+                ("complete", models.PositiveIntegerField(default=0)),
+                ("incomplete", models.PositiveIntegerField(default=0)),
+                ("points", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_agent_stats, migrations.RunPython.noop),
+    ]
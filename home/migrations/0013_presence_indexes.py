@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0012_agentstats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(fields=["user", "-created_at"], name="home_auditl_user_id_86b4b8_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="sessionsnapshot",
+            index=models.Index(fields=["user", "-last_activity"], name="home_sessio_user_id_12313d_idx"),
+        ),
+    ]
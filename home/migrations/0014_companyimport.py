@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("home", "0013_presence_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompanyImport",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("filename", models.CharField(blank=True, max_length=255)),
+                ("row_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="company_imports",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="CompanyImportRow",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("line", models.PositiveIntegerField()),
+                ("name", models.CharField(max_length=255)),
+                ("phone", models.CharField(max_length=32)),
+                ("product", models.CharField(blank=True, max_length=255)),
+                ("activity", models.CharField(blank=True, max_length=255)),
+                ("location", models.CharField(blank=True, max_length=255)),
+                ("legal_form", models.CharField(blank=True, max_length=255)),
+                ("niu", models.CharField(blank=True, max_length=128)),
+                ("validity_score", models.DecimalField(decimal_places=1, default=0, max_digits=4)),
+                ("status", models.CharField(default="pending", max_length=32)),
+                (
+                    "batch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rows",
+                        to="home.companyimport",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["batch", "line"], name="home_compan_batch_i_076e5c_idx")],
+            },
+        ),
+    ]
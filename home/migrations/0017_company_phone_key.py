@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+from home import phones
+
+
+def backfill_phone_keys(apps, schema_editor):
+    phones.backfill(apps.get_model("home", "Company"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0016_backgroundjob"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="company",
+            name="home_compan_phone_9e0fc0_idx",
+        ),
+        migrations.AddField(
+            model_name="company",
+            name="phone_key",
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(fields=["phone_key"], name="home_compan_phone_k_705fe7_idx"),
+        ),
+        migrations.RunPython(backfill_phone_keys, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="companyimport",
+            name="duplicate_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="companyimportrow",
+            name="phone_key",
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name="companyimportrow",
+            name="duplicate_of",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
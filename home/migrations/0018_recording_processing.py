@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0017_company_phone_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recording",
+            name="original_size",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="size_bytes",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="processed_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+import home.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0018_recording_processing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recording",
+            name="content_hash",
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name="recording",
+            name="file",
+            field=models.FileField(storage=home.storage.get_recording_storage, upload_to="recordings/"),
+        ),
+    ]
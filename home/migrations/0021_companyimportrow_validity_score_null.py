@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0020_company_claim"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="companyimportrow",
+            name="validity_score",
+            field=models.DecimalField(blank=True, decimal_places=1, max_digits=4, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+import os
+import shutil
+
+from django.conf import settings
+from django.db import migrations, models
+
+import home.storage
+
+
+def move_job_files(apps, schema_editor):
+    # Exports et CSV envoyés déjà écrits sous MEDIA_ROOT/jobs/ : mêmes noms dans le stockage privé
+    source = os.path.join(settings.MEDIA_ROOT, "jobs")
+    if not os.path.isdir(source):
+        return
+    target = home.storage.private_storage.path("jobs")
+    for root, _dirs, files in os.walk(source):
+        for filename in files:
+            path = os.path.join(root, filename)
+            destination = os.path.join(target, os.path.relpath(path, source))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.move(path, destination)
+    shutil.rmtree(source, ignore_errors=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0021_companyimportrow_validity_score_null"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="backgroundjob",
+            name="result_file",
+            field=models.FileField(blank=True, storage=home.storage.get_private_storage, upload_to="jobs/"),
+        ),
+        migrations.RunPython(move_job_files, migrations.RunPython.noop),
+    ]
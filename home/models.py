@@ -1,4 +1,8 @@
 from django.db import models
+from django.utils import timezone
+
+from .phones import normalize_phone
+from .storage import content_hash_of, get_private_storage, get_recording_storage
 
 
 class Company(models.Model):
@@ -11,6 +15,9 @@ class Company(models.Model):
 
     name = models.CharField(max_length=255)
     phone = models.CharField(max_length=32)
+    # Téléphone normalisé (phones.normalize_phone), recalculé à chaque save() ;
+    # les imports le renseignent eux-mêmes (bulk_create), backfill : manage.py backfill_phone_keys
+    phone_key = models.CharField(max_length=20, blank=True, editable=False)
     product = models.CharField(max_length=255, blank=True)
     activity = models.CharField(max_length=255, blank=True)
     location = models.CharField(max_length=255, blank=True)
@@ -18,10 +25,52 @@ class Company(models.Model):
     niu = models.CharField(max_length=128, blank=True)
     validity_score = models.DecimalField(max_digits=4, decimal_places=1, default=0)
     status = models.CharField(max_length=32, choices=STATUS_CHOICES, default="pending")
+    # Numéro de la dernière modification (statut/inspecteur), voir changes.py
+    change_seq = models.BigIntegerField(default=0, db_index=True)
+    # Dernier appel enregistré, tenu à jour par call_form (backfill : manage.py backfill_latest_calls)
+    latest_call = models.ForeignKey(
+        "CallRecord", null=True, blank=True, on_delete=models.SET_NULL, related_name="+", editable=False
+    )
+    # Bail de l'agent qui a ouvert la fiche (statut « En cours »), voir claims.py
+    claimed_by = models.ForeignKey(
+        "auth.User", null=True, blank=True, on_delete=models.SET_NULL, related_name="claimed_companies", editable=False
+    )
+    claim_expires_at = models.DateTimeField(null=True, blank=True, editable=False)
+    claim_prev_status = models.CharField(max_length=32, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "name", "id"]),
+            models.Index(fields=["status", "claim_expires_at"]),
+            models.Index(fields=["product"]),
+            # Clés de rapprochement de l'import en fusion (voir importer.apply_merge)
+            models.Index(fields=["niu"]),
+            models.Index(fields=["phone_key"]),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.phone_key = normalize_phone(self.phone)
+        super().save(*args, **kwargs)
+
+
+class ChangeCounter(models.Model):
+    """Compteur monotone nommé servant de curseur aux clients en polling."""
+
+    name = models.CharField(max_length=32, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.name}={self.value}"
+
+
+class CallRecordQuerySet(models.QuerySet):
+    def with_audio_flag(self):
+        """Annote ``has_audio`` (au moins un enregistrement) par sous-requête EXISTS."""
+        return self.annotate(has_audio=models.Exists(Recording.objects.filter(call=models.OuterRef("pk"))))
+
 
 class CallRecord(models.Model):
     STATUS_NUMERO_CHOICES = [
@@ -57,6 +106,11 @@ class CallRecord(models.Model):
     user = models.ForeignKey("auth.User", null=True, blank=True, on_delete=models.SET_NULL, related_name="call_records")
     questionnaire_data = models.JSONField(default=dict, blank=True)
 
+    objects = CallRecordQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["company", "-created_at"])]
+
     def __str__(self) -> str:
         return f"Call {self.company.name} - {self.get_status_numero_display()}"
 
@@ -76,16 +130,115 @@ class CallRecord(models.Model):
         return "Partiel"
 
 
+class AgentStats(models.Model):
+    """Compteurs d'appels par agent, incrémentés à l'enregistrement d'un appel."""
+
+    user = models.OneToOneField("auth.User", on_delete=models.CASCADE, primary_key=True, related_name="agent_stats")
+    total = models.PositiveIntegerField(default=0)
+    complete = models.PositiveIntegerField(default=0)
+    incomplete = models.PositiveIntegerField(default=0)
+    points = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"Stats {self.user_id}: {self.points} pts"
+
+
 class Recording(models.Model):
     call = models.ForeignKey(CallRecord, on_delete=models.CASCADE, related_name="recordings")
-    file = models.FileField(upload_to="recordings/")
+    file = models.FileField(upload_to="recordings/", storage=get_recording_storage)
+    # SHA-256 du fichier, repris de son nom (storage.ContentAddressedStorage)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
     mime_type = models.CharField(max_length=64, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     duration_seconds = models.PositiveIntegerField(default=0)
+    # Renseignés par recordings.process_pending (conversion Opus hors requête)
+    original_size = models.PositiveBigIntegerField(default=0)
+    size_bytes = models.PositiveBigIntegerField(default=0)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     def __str__(self) -> str:
         return f"Recording for {self.call}"
 
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            # Écrit le fichier maintenant : son nom définitif donne l'empreinte
+            self.file.save(self.file.name, self.file.file, save=False)
+        self.content_hash = content_hash_of(self.file.name)
+        super().save(*args, **kwargs)
+
+    @property
+    def bytes_saved(self) -> int:
+        return max(0, self.original_size - self.size_bytes) if self.processed_at else 0
+
+
+class CompanyImport(models.Model):
+    """Import CSV en attente de confirmation ; ses lignes sont dans ``CompanyImportRow``."""
+
+    user = models.ForeignKey("auth.User", null=True, blank=True, on_delete=models.SET_NULL, related_name="company_imports")
+    filename = models.CharField(max_length=255, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    duplicate_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"Import {self.id} ({self.row_count} lignes)"
+
+
+class CompanyImportRow(models.Model):
+    """Ligne d'import normalisée, mêmes champs que ``Company``."""
+
+    batch = models.ForeignKey(CompanyImport, on_delete=models.CASCADE, related_name="rows")
+    line = models.PositiveIntegerField()
+    name = models.CharField(max_length=255)
+    phone = models.CharField(max_length=32)
+    product = models.CharField(max_length=255, blank=True)
+    activity = models.CharField(max_length=255, blank=True)
+    location = models.CharField(max_length=255, blank=True)
+    legal_form = models.CharField(max_length=255, blank=True)
+    niu = models.CharField(max_length=128, blank=True)
+    # Vide si la colonne est absente du fichier : la fusion garde alors le score existant
+    validity_score = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True)
+    status = models.CharField(max_length=32, default="pending")
+    phone_key = models.CharField(max_length=20, blank=True)
+    # Première ligne du fichier portant le même numéro : ligne ignorée à la confirmation
+    duplicate_of = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["batch", "line"])]
+
+
+class BackgroundJob(models.Model):
+    """Tâche longue (import, export) exécutée par ``manage.py run_jobs``, voir jobs.py."""
+
+    STATUS_CHOICES = [
+        ("queued", "En attente"),
+        ("running", "En cours"),
+        ("done", "Terminée"),
+        ("failed", "Échouée"),
+    ]
+
+    kind = models.CharField(max_length=32)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="queued")
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    message = models.TextField(blank=True)
+    result = models.JSONField(default=dict, blank=True)
+    # Stockage privé (PRIVATE_STORAGE_ROOT) : téléchargé uniquement par job_download
+    result_file = models.FileField(upload_to="jobs/", storage=get_private_storage, blank=True)
+    user = models.ForeignKey("auth.User", null=True, blank=True, on_delete=models.SET_NULL, related_name="background_jobs")
+    worker = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "id"])]
+
+    def __str__(self) -> str:
+        return f"{self.kind} #{self.id} ({self.status})"
+
 
 class AuditLog(models.Model):
     user = models.ForeignKey("auth.User", null=True, blank=True, on_delete=models.SET_NULL, related_name="audit_logs")
@@ -97,11 +250,16 @@ class AuditLog(models.Model):
     user_agent = models.TextField(blank=True)
     duration_ms = models.PositiveIntegerField(default=0)
     payload_summary = models.TextField(blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Horodaté à la réception de la requête, pas à l'écriture différée du lot.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
-        indexes = [models.Index(fields=["created_at"]), models.Index(fields=["path"])]
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["path"]),
+            models.Index(fields=["user", "-created_at"]),
+        ]
 
     def __str__(self) -> str:
         user_display = self.user.get_username() if self.user else "Anon"
@@ -120,7 +278,11 @@ class SessionSnapshot(models.Model):
 
     class Meta:
         ordering = ["-last_activity"]
-        indexes = [models.Index(fields=["last_activity"]), models.Index(fields=["session_key"])]
+        indexes = [
+            models.Index(fields=["last_activity"]),
+            models.Index(fields=["session_key"]),
+            models.Index(fields=["user", "-last_activity"]),
+        ]
 
     def __str__(self) -> str:
         user_display = self.user.get_username() if self.user else "Anon"
@@ -0,0 +1,145 @@
+"""
+Pagination par curseur (keyset).
+
+Au lieu d'un OFFSET, chaque page repart des valeurs de tri de la dernière
+(ou première) ligne affichée : le coût d'une page ne dépend pas de sa
+profondeur. Le curseur est opaque côté client (JSON en base64 URL) et
+transporte aussi la position de la ligne pour garder la numérotation.
+"""
+from __future__ import annotations
+
+import base64
+import datetime
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder tronque à la milliseconde : la borne ne retomberait pas sur la ligne
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values: list, position: int) -> str:
+    raw = json.dumps({"k": values, "p": position}, cls=_CursorEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[dict]:
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        if isinstance(data.get("k"), list) and isinstance(data.get("p"), int):
+            return data
+    except (ValueError, TypeError, AttributeError):
+        pass
+    return None
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    start_index: int
+    has_next: bool = False
+    has_previous: bool = False
+    next_cursor: str = ""
+    previous_cursor: str = ""
+
+    @property
+    def end_index(self) -> int:
+        return self.start_index + len(self.object_list) - 1
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _boundary(model, ordering: list[str], values: list, forward: bool) -> Optional[Q]:
+    """
+    ``(f1, f2, ...) > (v1, v2, ...)`` en tenant compte du sens de chaque champ ;
+    ``None`` si les valeurs ne correspondent pas au tri (curseur altéré ou périmé).
+    """
+    if len(values) != len(ordering):
+        return None
+    condition = Q()
+    equal = Q()
+    for name, value in zip(ordering, values):
+        descending = name.startswith("-")
+        field_name = name.lstrip("-")
+        try:
+            value = model._meta.get_field(field_name).to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            return None
+        if value is None:
+            return None
+        lookup = "lt" if descending == forward else "gt"
+        condition |= equal & Q(**{f"{field_name}__{lookup}": value})
+        equal &= Q(**{field_name: value})
+    return condition
+
+
+def _reverse(ordering: list[str]) -> list[str]:
+    return [name[1:] if name.startswith("-") else f"-{name}" for name in ordering]
+
+
+def keyset_page(
+    queryset: QuerySet,
+    ordering: list[str],
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    page_size: int = 50,
+) -> KeysetPage:
+    """
+    Page de ``page_size`` lignes après ``after`` (ou avant ``before``).
+
+    ``ordering`` doit se terminer par un champ unique (ex. ``id``) pour que
+    le curseur désigne une ligne sans ambiguïté.
+    """
+    fields = [name.lstrip("-") for name in ordering]
+    # Curseur illisible ou incompatible avec le tri : première page, comme sans curseur
+    after_cursor = decode_cursor(after)
+    after_q = _boundary(queryset.model, ordering, after_cursor["k"], forward=True) if after_cursor else None
+    if after_q is None:
+        after_cursor = None
+    before_cursor = decode_cursor(before) if after_cursor is None else None
+    before_q = _boundary(queryset.model, ordering, before_cursor["k"], forward=False) if before_cursor else None
+    if before_q is None:
+        before_cursor = None
+
+    if before_cursor is not None:
+        rows = list(
+            queryset.filter(before_q)
+            .order_by(*_reverse(ordering))[: page_size + 1]
+        )
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        start = max(1, before_cursor["p"] - len(rows))
+        has_next = True
+    else:
+        base = queryset
+        start = 1
+        if after_cursor is not None:
+            base = base.filter(after_q)
+            start = after_cursor["p"] + 1
+        rows = list(base.order_by(*ordering)[: page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after_cursor is not None
+
+    page = KeysetPage(object_list=rows, start_index=start, has_next=has_next, has_previous=has_previous)
+    if rows:
+        first, last = rows[0], rows[-1]
+        page.previous_cursor = encode_cursor([getattr(first, f) for f in fields], start)
+        page.next_cursor = encode_cursor([getattr(last, f) for f in fields], start + len(rows) - 1)
+    return page
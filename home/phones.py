@@ -0,0 +1,59 @@
+"""
+Normalisation des numéros de téléphone en clé de type E.164 (``+<indicatif><numéro>``).
+
+« +237 6 99 00 00 01 », « 00237699000001 » et « 699 00 00 01 » (indicatif
+par défaut ``PHONE_DEFAULT_COUNTRY_CODE`` = 237, numéros nationaux à
+``PHONE_NATIONAL_DIGITS`` = 9 chiffres) donnent tous ``+237699000001``. Les valeurs sans
+numéro exploitable (« Non renseigne », moins de 6 chiffres) donnent ``""``.
+"""
+from __future__ import annotations
+
+import re
+
+from django.conf import settings
+
+_NON_DIGITS = re.compile(r"\D")
+MIN_DIGITS = 6
+MAX_DIGITS = 15
+
+
+def normalize_phone(raw: str) -> str:
+    if not raw:
+        return ""
+    raw = raw.strip()
+    digits = _NON_DIGITS.sub("", raw)
+    if len(digits) < MIN_DIGITS:
+        return ""
+    country = getattr(settings, "PHONE_DEFAULT_COUNTRY_CODE", "")
+    national = getattr(settings, "PHONE_NATIONAL_DIGITS", 0)
+    if raw.startswith("+"):
+        key = digits
+    elif digits.startswith("00"):
+        key = digits[2:]
+    elif digits.startswith("0"):
+        # Préfixe national (0) : remplacé par l'indicatif par défaut
+        key = country + digits[1:]
+    elif country and national and len(digits) == len(country) + national and digits.startswith(country):
+        key = digits
+    else:
+        key = country + digits
+    return f"+{key[:MAX_DIGITS]}"
+
+
+def backfill(model, batch_size: int = 2000) -> int:
+    """Recalcule ``phone_key`` de ``model`` par paquets de clés primaires ; renvoie le nombre de lignes modifiées."""
+    updated = 0
+    last = 0
+    while True:
+        rows = list(model.objects.filter(pk__gt=last).order_by("pk").only("pk", "phone", "phone_key")[:batch_size])
+        if not rows:
+            return updated
+        last = rows[-1].pk
+        changed = []
+        for row in rows:
+            key = normalize_phone(row.phone)
+            if row.phone_key != key:
+                row.phone_key = key
+                changed.append(row)
+        model.objects.bulk_update(changed, ["phone_key"], batch_size=batch_size)
+        updated += len(changed)
@@ -0,0 +1,150 @@
+"""
+Traitement des enregistrements après envoi, hors requête.
+
+``upload_recording`` programme une tâche « recordings » (voir jobs.py) ; le
+worker traite tous les ``Recording`` non traités dans un pool de processus
+(``RECORDING_WORKERS``) : conversion en Opus mono bas débit si ffmpeg est
+présent, durée réelle lue dans le conteneur, octets gagnés et forme d'onde
+(``<fichier>.peaks``, servie par ``recording_peaks``).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from . import audio, metrics
+from .models import Recording
+from .storage import PEAKS_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+
+
+def ffmpeg_binary() -> str:
+    """Chemin de ffmpeg (``RECORDING_FFMPEG`` ou PATH) ; ``""`` pour la durée seule."""
+    configured = getattr(settings, "RECORDING_FFMPEG", None)
+    if configured is not None:
+        return configured
+    return shutil.which("ffmpeg") or ""
+
+
+def _apply(recording: Recording, result: dict) -> None:
+    output = result["output"]
+    old_name = ""
+    if output:
+        old_name = recording.file.name
+        base = os.path.splitext(os.path.basename(old_name))[0]
+        try:
+            with open(output, "rb") as fh:
+                recording.file.save(f"{base}.{audio.OUTPUT_EXT}", File(fh), save=False)
+        finally:
+            os.remove(output)
+        recording.mime_type = audio.OUTPUT_MIME
+        metrics.incr("recordings.transcoded")
+    if result.get("peaks"):
+        recording.file.storage.save_sidecar(recording.file.name, PEAKS_SUFFIX, result["peaks"])
+        metrics.incr("recordings.waveforms")
+    recording.original_size = result["original_size"]
+    recording.size_bytes = recording.file.size
+    recording.duration_seconds = round(result["duration"] or 0)
+    recording.processed_at = timezone.now()
+    recording.save(update_fields=["file", "content_hash", "mime_type", "original_size", "size_bytes", "duration_seconds", "processed_at"])
+    if old_name and old_name != recording.file.name:
+        # Fichier d'origine retiré une fois la ligne enregistrée (éventuellement partagé : stockage dédoublonné)
+        storage = recording.file.storage
+        transaction.on_commit(lambda: storage.delete_if_unused(old_name, Recording))
+    metrics.incr("recordings.processed")
+    metrics.incr("recordings.bytes_saved", recording.bytes_saved)
+
+
+def process_pending(progress: Optional[Callable] = None, workers: Optional[int] = None) -> dict:
+    """Traite les enregistrements sans ``processed_at`` ; renvoie le bilan (nombre, octets gagnés)."""
+    pending = Recording.objects.filter(processed_at__isnull=True)
+    total = pending.count()
+    if progress:
+        progress(0, total)
+    ffmpeg = ffmpeg_binary()
+    bitrate = getattr(settings, "RECORDING_BITRATE", "24k")
+    workers = workers or getattr(settings, "RECORDING_WORKERS", 2)
+    peaks_per_second = getattr(settings, "RECORDING_PEAKS_PER_SECOND", 20)
+    done = saved = 0
+    last = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = list(pending.filter(id__gt=last).order_by("id")[:BATCH_SIZE])
+            if not batch:
+                break
+            last = batch[-1].id
+            futures = {
+                pool.submit(audio.process_file, rec.file.path, ffmpeg, bitrate, peaks_per_second): rec for rec in batch
+            }
+            for future in as_completed(futures):
+                recording = futures[future]
+                try:
+                    _apply(recording, future.result())
+                    saved += recording.bytes_saved
+                except Exception:
+                    # Fichier absent ou illisible : marqué traité pour ne pas boucler dessus
+                    logger.exception("Enregistrement %s non traité", recording.id)
+                    metrics.incr("recordings.failed")
+                    Recording.objects.filter(id=recording.id).update(processed_at=timezone.now())
+                done += 1
+                if progress:
+                    progress(done, total)
+    return {"processed": done, "bytes_saved": saved, "transcoded": bool(ffmpeg)}
+
+
+def backfill_peaks(workers: Optional[int] = None) -> int:
+    """Calcule la forme d'onde des enregistrements déjà traités qui n'en ont pas ; renvoie leur nombre."""
+    ffmpeg = ffmpeg_binary()
+    if not ffmpeg:
+        return 0
+    workers = workers or getattr(settings, "RECORDING_WORKERS", 2)
+    peaks_per_second = getattr(settings, "RECORDING_PEAKS_PER_SECOND", 20)
+    written = 0
+    last = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = list(Recording.objects.filter(id__gt=last, processed_at__isnull=False).order_by("id")[:BATCH_SIZE])
+            if not batch:
+                return written
+            last = batch[-1].id
+            storage = batch[0].file.storage
+            futures = {
+                pool.submit(audio.compute_peaks, rec.file.path, ffmpeg, peaks_per_second): rec
+                for rec in batch
+                if rec.file and storage.exists(rec.file.name) and not storage.exists(rec.file.name + PEAKS_SUFFIX)
+            }
+            for future in as_completed(futures):
+                recording = futures[future]
+                peaks = future.result()
+                if peaks:
+                    storage.save_sidecar(recording.file.name, PEAKS_SUFFIX, peaks)
+                    written += 1
+
+
+def load_peaks(recording: Recording) -> Optional[tuple[int, bytes]]:
+    """(pics par seconde, pics) de l'enregistrement ; ``None`` s'ils ne sont pas (encore) calculés."""
+    storage = recording.file.storage
+    name = recording.file.name + PEAKS_SUFFIX
+    if not storage.exists(name):
+        return None
+    with storage.open(name, "rb") as fh:
+        return audio.read_peaks(fh.read())
+
+
+def downsample(peaks: bytes, count: int) -> bytes:
+    """Réduit à ``count`` pics (maximum de chaque groupe) pour un affichage plus étroit."""
+    if count <= 0 or count >= len(peaks):
+        return peaks
+    step = len(peaks) / count
+    return bytes(max(peaks[int(i * step):max(int(i * step) + 1, int((i + 1) * step))]) for i in range(count))
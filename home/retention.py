@@ -0,0 +1,49 @@
+"""
+Purge des journaux d'audit et des sessions au-delà de la rétention.
+
+La suppression se fait par tranches de clés primaires pour ne jamais tenir
+le verrou d'écriture SQLite longtemps. Lancée par ``manage.py prune_audit``
+(cron) ou par le worker ``manage.py run_jobs`` toutes les
+``AUDIT_PRUNE_EVERY_HOURS`` heures : un seul processus, jamais pendant une requête.
+"""
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import metrics
+from .models import AuditLog, SessionSnapshot
+
+
+def prune_model(model, date_field: str, cutoff, batch_size: int = 5000, pause: float = 0.0) -> int:
+    """Supprime les lignes ``date_field < cutoff`` par plages de ``batch_size`` clés."""
+    expired = model.objects.filter(**{f"{date_field}__lt": cutoff})
+    bounds = expired.aggregate(lo=Min("pk"), hi=Max("pk"))
+    if bounds["lo"] is None:
+        return 0
+    deleted = 0
+    start = bounds["lo"]
+    while start <= bounds["hi"]:
+        count, _ = expired.filter(pk__gte=start, pk__lt=start + batch_size).delete()
+        deleted += count
+        start += batch_size
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def prune_audit(retention_days: Optional[int] = None, batch_size: Optional[int] = None, pause: float = 0.0) -> dict:
+    retention_days = retention_days or getattr(settings, "AUDIT_RETENTION_DAYS", 90)
+    batch_size = batch_size or getattr(settings, "AUDIT_PRUNE_BATCH_SIZE", 5000)
+    cutoff = timezone.now() - timezone.timedelta(days=retention_days)
+    result = {
+        "audit_logs": prune_model(AuditLog, "created_at", cutoff, batch_size, pause),
+        "sessions": prune_model(SessionSnapshot, "last_activity", cutoff, batch_size, pause),
+    }
+    metrics.incr("retention.runs")
+    metrics.incr("retention.deleted", sum(result.values()))
+    return result
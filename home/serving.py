@@ -0,0 +1,120 @@
+"""
+Envoi des fichiers médias protégés (enregistrements) avec reprise partielle.
+
+Trois modes selon ``RECORDING_SERVE_MODE`` :
+
+- ``"django"`` : ``FileResponse`` (sendfile du serveur WSGI quand il existe),
+  requêtes ``Range`` en 206, ETag/Last-Modified et réponses 304 ;
+- ``"nginx"`` : en-tête ``X-Accel-Redirect`` vers une location ``internal``
+  (``RECORDING_ACCEL_PREFIX``), Nginx gère Range et cache ;
+- ``"sendfile"`` : en-tête ``X-Sendfile`` (Apache mod_xsendfile, Lighttpd).
+
+Le contrôle d'accès reste dans la vue : seul l'envoi des octets est délégué.
+"""
+from __future__ import annotations
+
+import os
+import re
+from typing import Optional
+
+from django.conf import settings
+from django.http import FileResponse, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    Première plage d'un en-tête ``Range`` en (début, fin incluse) bornée à
+    ``size`` ; ``None`` si l'en-tête est absent ou non géré (fichier complet),
+    ``(size, size)`` si la plage est hors fichier (416).
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not size:
+        return size, size
+    if not start:
+        # « bytes=-500 » : les 500 derniers octets
+        length = int(end)
+        if not length:
+            return size, size
+        return max(0, size - length), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        return size, size
+    return start, min(int(end), size - 1) if end else size - 1
+
+
+def _iter_slice(fh, length: int):
+    try:
+        while length > 0:
+            data = fh.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        fh.close()
+
+
+def _range_allowed(request: HttpRequest, etag: str, mtime: int) -> bool:
+    """``If-Range`` : la plage ne vaut que si le fichier n'a pas changé."""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/"')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == mtime
+
+
+def serve_file(request: HttpRequest, fieldfile, content_type: str) -> HttpResponse:
+    storage = fieldfile.storage
+    name = fieldfile.name
+    mode = getattr(settings, "RECORDING_SERVE_MODE", "django")
+    if mode == "nginx":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = getattr(settings, "RECORDING_ACCEL_PREFIX", "/protected-media/") + name
+        return response
+    if mode == "sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = storage.path(name)
+        return response
+
+    stat = os.stat(storage.path(name))
+    size = stat.st_size
+    mtime = int(stat.st_mtime)
+    etag = quote_etag(f"{size:x}-{stat.st_mtime_ns:x}")
+    response = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if response is None:
+        span = parse_range(request.headers.get("Range", ""), size)
+        if span is not None and not _range_allowed(request, etag, mtime):
+            span = None
+        if span == (size, size):
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+        elif span is None:
+            response = FileResponse(storage.open(name, "rb"), content_type=content_type)
+        else:
+            start, end = span
+            fh = storage.open(name, "rb")
+            fh.seek(start)
+            if end == size - 1:
+                # Jusqu'à la fin (cas des lecteurs audio) : le serveur peut utiliser sendfile
+                response = FileResponse(fh, content_type=content_type, status=206)
+            else:
+                response = StreamingHttpResponse(_iter_slice(fh, end - start + 1), content_type=content_type, status=206)
+                response["Content-Length"] = str(end - start + 1)
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(mtime)
+    # Revalidation à chaque lecture (304 sans corps) : le fichier peut être converti après coup
+    response["Cache-Control"] = "private, no-cache"
+    return response
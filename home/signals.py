@@ -2,7 +2,8 @@ from django.contrib.auth import user_logged_in, user_logged_out
 from django.dispatch import receiver
 from django.utils import timezone
 
-from .models import AuditLog, SessionSnapshot
+from . import audit
+from .models import SessionSnapshot
 
 
 def _get_ip(request):
@@ -42,7 +43,7 @@ def log_login(sender, request, user, **kwargs):
             "is_active": True,
         },
     )
-    AuditLog.objects.create(
+    audit.record(
         user=user,
         session_key=session_key,
         ip_address=ip_addr,
@@ -61,11 +62,12 @@ def log_logout(sender, request, user, **kwargs):
     ip_addr = _get_ip(request)
     ua = request.META.get("HTTP_USER_AGENT", "") if request else ""
     now = timezone.now()
+    audit.forget_session(session_key)
     SessionSnapshot.objects.filter(session_key=session_key).update(
         is_active=False,
         last_activity=now,
     )
-    AuditLog.objects.create(
+    audit.record(
         user=user if user.is_authenticated else None,
         session_key=session_key,
         ip_address=ip_addr,
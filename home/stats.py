@@ -0,0 +1,186 @@
+"""
+Statistiques agrégées affichées sur l'accueil et le tableau de bord.
+
+Le classement des agents lit la table ``AgentStats`` (une ligne par agent),
+incrémentée par ``record_call`` dans la transaction de ``call_form``.
+``rebuild_agent_stats`` la recalcule en une requête groupée si l'historique
+change autrement (import en remplacement, admin).
+
+Les agrégats du tableau de bord sont calculés en SQL et mis en cache
+(``DASHBOARD_STATS_TTL``) sous une clé versionnée par les compteurs de
+``changes`` : tout appel enregistré ou changement de statut produit une
+nouvelle clé, dans tous les processus.
+"""
+from __future__ import annotations
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from . import changes, metrics
+from .models import AgentStats, CallRecord, ChangeCounter, Company
+
+# Appel « complet » : questionnaire accepté et les trois niveaux renseignés
+COMPLETE_CALL = (
+    Q(call_status="accepted")
+    & ~Q(presentation_level="")
+    & ~Q(questions_libres_level="")
+    & ~Q(questions_orientees_level="")
+)
+
+
+def is_complete_call(call: CallRecord) -> bool:
+    return bool(
+        call.call_status == "accepted"
+        and call.presentation_level
+        and call.questions_libres_level
+        and call.questions_orientees_level
+    )
+
+
+def record_call(call: CallRecord) -> None:
+    """Ajoute un appel enregistré aux compteurs de son agent."""
+    if not call.user_id:
+        return
+    complete = int(is_complete_call(call))
+    increments = {
+        "total": F("total") + 1,
+        "complete": F("complete") + complete,
+        "incomplete": F("incomplete") + (1 - complete),
+        "points": F("points") + (2 if complete else 1),
+    }
+    with transaction.atomic():
+        if not AgentStats.objects.filter(user_id=call.user_id).update(**increments):
+            AgentStats.objects.get_or_create(user_id=call.user_id)
+            AgentStats.objects.filter(user_id=call.user_id).update(**increments)
+
+
+def rebuild_agent_stats(user_ids=None) -> int:
+    """
+    Recalcule les compteurs depuis ``CallRecord`` (agrégation conditionnelle
+    groupée) : tous les agents, ou seulement ``user_ids``.
+    """
+    calls = CallRecord.objects.filter(user__isnull=False)
+    existing = AgentStats.objects.all()
+    if user_ids is not None:
+        user_ids = [pk for pk in set(user_ids) if pk is not None]
+        calls = calls.filter(user_id__in=user_ids)
+        existing = existing.filter(user_id__in=user_ids)
+    rows = (
+        calls.values("user_id")
+        .annotate(total=Count("id"), complete=Count("id", filter=COMPLETE_CALL))
+        .order_by()
+    )
+    stats = [
+        AgentStats(
+            user_id=row["user_id"],
+            total=row["total"],
+            complete=row["complete"],
+            incomplete=row["total"] - row["complete"],
+            points=2 * row["complete"] + (row["total"] - row["complete"]),
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        existing.delete()
+        AgentStats.objects.bulk_create(stats)
+    return len(stats)
+
+
+def user_cards() -> list[dict]:
+    """Points et compteurs d'appels par agent (accueil et ``user_stats``)."""
+    User = get_user_model()
+    users = list(User.objects.select_related("agent_stats").order_by("username"))
+    stats = {}
+    for u in users:
+        try:
+            stats[u.id] = u.agent_stats
+        except AgentStats.DoesNotExist:
+            continue
+
+    max_points = max([s.points for s in stats.values()] or [1])
+    user_cards = []
+    for u in users:
+        stat = stats.get(u.id)
+        points = stat.points if stat else 0
+        user_cards.append(
+            {
+                "username": u.get_username(),
+                "initial": (u.get_username()[:1] or "U").upper(),
+                "total": stat.total if stat else 0,
+                "complete": stat.complete if stat else 0,
+                "incomplete": stat.incomplete if stat else 0,
+                "points": points,
+                "ratio": int((points / max_points) * 100) if max_points else 0,
+            }
+        )
+    user_cards.sort(key=lambda x: x["username"].lower())
+    return user_cards
+
+
+def dashboard_stats() -> dict:
+    """Agrégats du tableau de bord, servis depuis le cache tant qu'aucune modification n'a eu lieu."""
+    versions = dict(
+        ChangeCounter.objects.filter(name__in=[changes.COMPANIES, changes.CALLS]).values_list("name", "value")
+    )
+    key = f"dashboard:stats:{versions.get(changes.COMPANIES, 0)}:{versions.get(changes.CALLS, 0)}"
+    data = cache.get(key)
+    if data is not None:
+        metrics.incr("dashboard.cache_hit")
+        return data
+    metrics.incr("dashboard.cache_miss")
+    data = compute_dashboard_stats()
+    cache.set(key, data, getattr(settings, "DASHBOARD_STATS_TTL", 30))
+    return data
+
+
+def compute_dashboard_stats() -> dict:
+    status_map = dict(Company.objects.values_list("status").annotate(total=Count("id")).order_by())
+    success_calls = CallRecord.objects.filter(call_status="accepted")
+    calls_by_status = list(
+        success_calls.values("status_numero").annotate(total=Count("id")).order_by("status_numero")
+    )
+    by_product = list(
+        success_calls.values("company__product")
+        .annotate(
+            total=Count("id"),
+            complete=Count(
+                "id",
+                filter=Q(
+                    presentation_level="complete",
+                    questions_libres_level="complete",
+                    questions_orientees_level="complete",
+                ),
+            ),
+        )
+        .order_by("company__product")
+    )
+    calls_with_audio = success_calls.with_audio_flag().filter(has_audio=True).count()
+    calls_total = sum(row["total"] for row in by_product)
+
+    # Un appel accepté est « Complet » si les trois niveaux le sont, sinon « Partiel »
+    enquete_map = {}
+    for row in by_product:
+        bucket = enquete_map.setdefault(
+            row["company__product"] or "Non renseigné", {"Complet": 0, "Partiel": 0, "Incomplet": 0}
+        )
+        bucket["Complet"] += row["complete"]
+        bucket["Partiel"] += row["total"] - row["complete"]
+
+    return {
+        "total_companies": sum(status_map.values()),
+        "pending": status_map.get("pending", 0),
+        "in_progress": status_map.get("in_progress", 0),
+        "done": status_map.get("done", 0),
+        "calls_total": calls_total,
+        "calls_answered": sum(row["total"] for row in calls_by_status if row["status_numero"] == "answered"),
+        "calls_by_status": calls_by_status,
+        "product_counts": [{"company__product": row["company__product"], "total": row["total"]} for row in by_product],
+        "calls_with_audio": calls_with_audio,
+        "calls_without_audio": calls_total - calls_with_audio,
+        "enquete_by_product": [
+            {"product": prod, **counts} for prod, counts in sorted(enquete_map.items(), key=lambda x: x[0].lower())
+        ],
+    }
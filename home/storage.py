@@ -0,0 +1,120 @@
+"""
+Stockage des enregistrements adressé par contenu.
+
+Chaque fichier est rangé sous ``recordings/<ab>/<cd>/<sha256>.<ext>`` (deux
+niveaux de 256 dossiers) : les répertoires restent petits même avec des
+centaines de milliers d'enregistrements, et un même contenu envoyé deux fois
+n'est écrit qu'une fois. L'écriture passe par un fichier temporaire du dossier
+cible puis ``os.replace`` : un fichier visible est toujours complet.
+
+Plusieurs ``Recording`` peuvent donc partager un fichier : ne le supprimer
+qu'avec ``delete_if_unused``, qui retire aussi ses fichiers annexes (forme
+d'onde ``.peaks``).
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK_SIZE = 1024 * 1024
+PEAKS_SUFFIX = ".peaks"
+SIDECAR_SUFFIXES = (PEAKS_SUFFIX,)
+_HASHED_NAME = re.compile(r"(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.[\w]+$")
+
+
+def content_hash_of(name: str) -> str:
+    """SHA-256 contenu dans un nom adressé par contenu ; ``""`` pour un ancien nom."""
+    match = _HASHED_NAME.search(name or "")
+    return match.group(1) if match else ""
+
+
+def sharded_name(directory: str, digest: str, ext: str) -> str:
+    return f"{directory}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif dépend du contenu (voir _save) : jamais de suffixe aléatoire
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name) or "."
+        ext = os.path.splitext(name)[1]
+        staging_dir = self.path(os.path.join(directory, ".tmp"))
+        os.makedirs(staging_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        if hasattr(content, "temporary_file_path"):
+            # Envoi déjà sur disque : lecture pour l'empreinte puis déplacement
+            with open(content.temporary_file_path(), "rb") as fh:
+                for block in iter(lambda: fh.read(HASH_CHUNK_SIZE), b""):
+                    digest.update(block)
+            fd, staged = tempfile.mkstemp(dir=staging_dir, suffix=".part")
+            os.close(fd)
+            file_move_safe(content.temporary_file_path(), staged, allow_overwrite=True)
+        else:
+            fd, staged = tempfile.mkstemp(dir=staging_dir, suffix=".part")
+            with os.fdopen(fd, "wb") as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+
+        final = sharded_name(directory, digest.hexdigest(), ext)
+        full_path = self.path(final)
+        if os.path.exists(full_path):
+            # Contenu déjà stocké : dédoublonné
+            os.remove(staged)
+            return final
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(staged, self.file_permissions_mode)
+        os.replace(staged, full_path)
+        return final
+
+    def save_sidecar(self, name: str, suffix: str, data: bytes) -> None:
+        """Écrit ``<name><suffix>`` à côté du fichier (même écriture atomique)."""
+        full_path = self.path(name + suffix)
+        fd, staged = tempfile.mkstemp(dir=os.path.dirname(full_path), suffix=".part")
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        if self.file_permissions_mode is not None:
+            os.chmod(staged, self.file_permissions_mode)
+        os.replace(staged, full_path)
+
+    def delete_if_unused(self, name: str, model, exclude_pk=None) -> bool:
+        """Supprime ``name`` et ses fichiers annexes si aucune ligne de ``model`` (hors ``exclude_pk``) n'y renvoie encore."""
+        others = model.objects.filter(file=name)
+        if exclude_pk is not None:
+            others = others.exclude(pk=exclude_pk)
+        if others.exists():
+            return False
+        self.delete(name)
+        for suffix in SIDECAR_SUFFIXES:
+            self.delete(name + suffix)
+        return True
+
+
+class PrivateStorage(FileSystemStorage):
+    """Fichiers hors ``MEDIA_ROOT`` et sans URL : lus uniquement par les vues qui contrôlent l'accès."""
+
+    def url(self, name):
+        raise ValueError("Fichier privé : pas d'URL publique")
+
+
+recording_storage = ContentAddressedStorage()
+private_storage = PrivateStorage(location=getattr(settings, "PRIVATE_STORAGE_ROOT", os.path.join(settings.BASE_DIR, "private")))
+
+
+def get_recording_storage():
+    return recording_storage
+
+
+def get_private_storage():
+    return private_storage
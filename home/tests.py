@@ -1,3 +1,275 @@
-from django.test import TestCase
+import datetime
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import changes, claims, importer
+from .models import CallRecord, Company, Recording
+from .pagination import encode_cursor, keyset_page
+from .serving import parse_range
+
+
+class KeysetPageTests(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name="Test", phone="699000000")
+        base = timezone.now().replace(microsecond=0)
+        calls = CallRecord.objects.bulk_create(
+            [CallRecord(company=company, status_numero="invalid") for _ in range(121)]
+        )
+        # Toutes les lignes dans la même milliseconde, seules les microsecondes diffèrent
+        for i, call in enumerate(calls):
+            CallRecord.objects.filter(id=call.id).update(created_at=base + datetime.timedelta(microseconds=i % 7))
+        self.ordering = ["-created_at", "-id"]
+        self.expected = list(
+            CallRecord.objects.order_by(*self.ordering).values_list("id", flat=True)
+        )
+
+    def test_forward_pages_cover_every_row_once(self):
+        seen = []
+        page = keyset_page(CallRecord.objects.all(), self.ordering, page_size=10)
+        seen += [c.id for c in page]
+        while page.has_next:
+            page = keyset_page(CallRecord.objects.all(), self.ordering, after=page.next_cursor, page_size=10)
+            seen += [c.id for c in page]
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_page_returns_preceding_rows(self):
+        first = keyset_page(CallRecord.objects.all(), self.ordering, page_size=10)
+        second = keyset_page(CallRecord.objects.all(), self.ordering, after=first.next_cursor, page_size=10)
+        back = keyset_page(CallRecord.objects.all(), self.ordering, before=second.previous_cursor, page_size=10)
+        self.assertEqual([c.id for c in second], self.expected[10:20])
+        self.assertEqual([c.id for c in back], self.expected[:10])
+        self.assertEqual(back.start_index, 1)
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        first = keyset_page(CallRecord.objects.all(), self.ordering, page_size=10)
+        for values in (["x", "y"], ["x", "y", "notint"], [None, 1], "x"):
+            cursor = encode_cursor(values, 1)
+            for page in (
+                keyset_page(CallRecord.objects.all(), self.ordering, after=cursor, page_size=10),
+                keyset_page(CallRecord.objects.all(), self.ordering, before=cursor, page_size=10),
+            ):
+                self.assertEqual([c.id for c in page], [c.id for c in first])
+                self.assertEqual(page.start_index, 1)
+
+
+class ImportMergeTests(TestCase):
+    CSV = (
+        "name;phone;product;activity;location;legal_form;niu;validity_score\n"
+        "Alpha;699000001;Cacao;Culture;Douala;SARL;NIU1;5\n"
+        "Beta;699000002;Mais;Culture;Yaounde;SA;;\n"
+        "Gamma;;Riz;Culture;Bafoussam;SARL;NIU3;\n"
+        "Delta;699000004;Manioc;Culture;Kribi;SA;NIU4;7\n"
+        "Sans cle;;Cafe;Culture;Limbe;SARL;;\n"
+    )
+
+    def merge(self, content):
+        batch = importer.stage_upload(SimpleUploadedFile("import.csv", content.encode("utf-8")))
+        return importer.apply_merge(batch)
+
+    def test_merging_the_same_file_twice_creates_nothing(self):
+        first = self.merge(self.CSV)
+        self.assertEqual((first["inserted"], first["rejected"]), (4, 1))
+        count = Company.objects.count()
+        second = self.merge(self.CSV)
+        self.assertEqual(Company.objects.count(), count)
+        self.assertEqual((second["inserted"], second["unchanged"], second["rejected"]), (0, 4, 1))
+
+    def test_unknown_niu_falls_back_to_phone(self):
+        company = Company.objects.create(name="Beta", phone="699000002", phone_key="+237699000002")
+        self.merge(self.CSV.replace("Beta;699000002;Mais;Culture;Yaounde;SA;;", "Beta;699000002;Mais;Culture;Yaounde;SA;NIU2;"))
+        company.refresh_from_db()
+        self.assertEqual(company.niu, "NIU2")
+        self.assertEqual(Company.objects.filter(phone_key="+237699000002").count(), 1)
+
+    def test_shared_phone_with_distinct_nius_is_not_a_duplicate(self):
+        csv = (
+            "name;phone;product;activity;location;legal_form;niu;validity_score\n"
+            "Alpha;699000001;Cacao;Culture;Douala;SARL;NIU1;\n"
+            "Alpha bis;699000001;Cacao;Culture;Douala;SARL;NIU2;\n"
+            "Alpha;699000001;Cacao;Culture;Douala;SARL;NIU1;\n"
+            "Beta;699000002;Mais;Culture;Yaounde;SA;;\n"
+            "Beta;699000002;Mais;Culture;Yaounde;SA;;\n"
+        )
+        batch = importer.stage_upload(SimpleUploadedFile("import.csv", csv.encode("utf-8")))
+        self.assertEqual(batch.duplicate_count, 2)
+        importer.apply_merge(batch)
+        self.assertEqual(sorted(Company.objects.values_list("niu", flat=True)), ["", "NIU1", "NIU2"])
+
+
+class ClaimTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+        self.company = Company.objects.create(name="Test", phone="699000000", status="callback")
+
+    def test_second_agent_conflicts(self):
+        self.assertTrue(claims.claim(self.company.id, self.alice))
+        self.assertFalse(claims.claim(self.company.id, self.bob))
+        self.company.refresh_from_db()
+        self.assertEqual((self.company.status, self.company.claimed_by), ("in_progress", self.alice))
+        self.assertEqual(self.company.claim_prev_status, "callback")
+
+    def test_owner_renewal_extends_lease_without_new_change_number(self):
+        claims.claim(self.company.id, self.alice)
+        self.company.refresh_from_db()
+        seq, expires_at = changes.current_seq(), self.company.claim_expires_at
+        self.assertTrue(claims.claim(self.company.id, self.alice))
+        self.company.refresh_from_db()
+        self.assertEqual(changes.current_seq(), seq)
+        self.assertGreater(self.company.claim_expires_at, expires_at)
+
+    def test_release_by_another_agent_is_a_no_op(self):
+        claims.claim(self.company.id, self.alice)
+        self.assertFalse(claims.release(self.company.id, self.bob))
+        self.company.refresh_from_db()
+        self.assertEqual((self.company.status, self.company.claimed_by), ("in_progress", self.alice))
+        self.assertTrue(claims.release(self.company.id, self.alice))
+        self.company.refresh_from_db()
+        self.assertEqual((self.company.status, self.company.claimed_by), ("callback", None))
+
+    def test_expired_leases_are_swept_back_to_previous_status(self):
+        pending = Company.objects.create(name="Autre", phone="699000001")
+        claims.claim(self.company.id, self.alice)
+        claims.claim(pending.id, self.bob)
+        Company.objects.update(claim_expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        seq = changes.current_seq()
+        self.assertEqual(claims.sweep_expired(), 2)
+        self.assertGreater(changes.current_seq(), seq)
+        self.assertEqual(
+            dict(Company.objects.values_list("id", "status")),
+            {self.company.id: "callback", pending.id: "pending"},
+        )
+        self.assertFalse(Company.objects.filter(claimed_by__isnull=False).exists())
+        self.assertTrue(claims.claim(self.company.id, self.bob))
+
+
+class RecordingTestCase(TestCase):
+    """Enregistrements écrits dans un MEDIA_ROOT temporaire, par un agent connecté."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.agent = User.objects.create_user("agent")
+        self.client.force_login(self.agent)
+        company = Company.objects.create(name="Test", phone="699000000")
+        self.call = CallRecord.objects.create(company=company, status_numero="answered", user=self.agent)
+        self.url = f"/api/calls/{self.call.id}/recording/"
+
+
+class RecordingUploadTests(RecordingTestCase):
+    def test_octet_stream_upload(self):
+        response = self.client.post(self.url + "?mime=audio/ogg", b"OggS audio", content_type="application/octet-stream")
+        self.assertEqual(response.status_code, 201)
+        recording = Recording.objects.get(id=response.json()["id"])
+        self.assertEqual(recording.mime_type, "audio/ogg")
+        with recording.file.open("rb") as fh:
+            self.assertEqual(fh.read(), b"OggS audio")
+
+    def test_multipart_upload(self):
+        upload = SimpleUploadedFile("call.webm", b"webm audio", content_type="audio/webm")
+        response = self.client.post(self.url, {"file": upload})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["size"], len(b"webm audio"))
+        self.assertEqual(Recording.objects.get().mime_type, "audio/webm")
+
+    @override_settings(RECORDING_MAX_UPLOAD_MB=1)
+    def test_upload_over_size_limit_is_rejected(self):
+        body = b"x" * (1024 * 1024 + 1)
+        response = self.client.post(self.url, body, content_type="application/octet-stream")
+        self.assertEqual(response.status_code, 413)
+        response = self.client.post(self.url, {"file": SimpleUploadedFile("call.webm", body)})
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Recording.objects.exists())
+
+    def test_empty_or_foreign_upload_is_rejected(self):
+        self.assertEqual(self.client.post(self.url, {}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, b"{}", content_type="application/json").status_code, 415)
+        self.client.force_login(User.objects.create_user("other"))
+        self.assertEqual(self.client.post(self.url, b"x", content_type="application/octet-stream").status_code, 403)
+
+
+class RecordingRangeTests(RecordingTestCase):
+    DATA = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        recording = Recording.objects.create(call=self.call, file=ContentFile(self.DATA, name="call.webm"), mime_type="audio/webm")
+        self.file_url = f"/enregistrements/{recording.id}/"
+
+    def get(self, **headers):
+        response = self.client.get(self.file_url, headers=headers)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=-100", 1024), (924, 1023))
+        self.assertEqual(parse_range("bytes=100-", 1024), (100, 1023))
+        self.assertEqual(parse_range("bytes=100-5000", 1024), (100, 1023))
+        self.assertEqual(parse_range("bytes=2000-", 1024), (1024, 1024))
+        self.assertIsNone(parse_range("bytes=5-2", 1024))
+        self.assertIsNone(parse_range("items=0-1", 1024))
+
+    def test_suffix_range(self):
+        response, body = self.get(Range="bytes=-100")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 924-1023/1024")
+        self.assertEqual(body, self.DATA[-100:])
+
+    def test_open_and_closed_ranges(self):
+        response, body = self.get(Range="bytes=1000-")
+        self.assertEqual((response.status_code, response["Content-Range"], body), (206, "bytes 1000-1023/1024", self.DATA[1000:]))
+        response, body = self.get(Range="bytes=10-19")
+        self.assertEqual((response.status_code, response["Content-Length"], body), (206, "10", self.DATA[10:20]))
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(Range="bytes=2000-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */1024")
+
+    def test_if_range_with_stale_etag_returns_whole_file(self):
+        response, _ = self.get()
+        etag = response["ETag"]
+        response, body = self.get(Range="bytes=0-9", **{"If-Range": '"stale"'})
+        self.assertEqual((response.status_code, body), (200, self.DATA))
+        response, body = self.get(Range="bytes=0-9", **{"If-Range": etag})
+        self.assertEqual((response.status_code, body), (206, self.DATA[:10]))
+        response, _ = self.get(**{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_anonymous_access_is_refused(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.file_url).status_code, 403)
+
+
+class RecordingStorageTests(RecordingTestCase):
+    def test_identical_uploads_share_one_stored_file(self):
+        for _ in range(2):
+            response = self.client.post(self.url, b"same audio", content_type="application/octet-stream")
+            self.assertEqual(response.status_code, 201)
+        first, second = Recording.objects.order_by("id")
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(len(first.content_hash), 64)
+        stored = [
+            name for _root, _dirs, files in os.walk(first.file.storage.path("recordings"))
+            for name in files
+            if not name.endswith(".part")
+        ]
+        self.assertEqual(stored, [os.path.basename(first.file.name)])
+
+        # Fichier partagé : conservé tant qu'une autre ligne y renvoie
+        storage = first.file.storage
+        self.assertFalse(storage.delete_if_unused(first.file.name, Recording, exclude_pk=first.pk))
+        self.assertTrue(storage.exists(first.file.name))
+        second.delete()
+        self.assertTrue(storage.delete_if_unused(first.file.name, Recording, exclude_pk=first.pk))
+        self.assertFalse(storage.exists(first.file.name))
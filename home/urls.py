@@ -11,8 +11,18 @@ urlpatterns = [
     path('appels/acces/', views.call_access, name='call_access'),
     path('appels/', views.call_list, name='call_list'),
     path('appels/<int:company_id>/remplir/', views.call_form, name='call_form'),
+    path('enregistrements/<int:recording_id>/', views.recording_file, name='recording_file'),
+    path('enregistrements/<int:recording_id>/forme-onde/', views.recording_peaks, name='recording_peaks'),
+    path('api/calls/<int:call_id>/recording/', views.upload_recording, name='upload_recording'),
     path('api/companies/status/', views.company_statuses, name='company_statuses'),
+    path('api/companies/lookup/', views.phone_lookup, name='phone_lookup'),
+    path('api/companies/<int:company_id>/claim/', views.claim_company, name='claim_company'),
     path('api/companies/<int:company_id>/reset/', views.reset_company_status, name='reset_company_status'),
     path('api/users/stats/', views.user_stats, name='user_stats'),
+    path('api/events/', views.live_events, name='live_events'),
+    path('api/metrics/', views.metrics, name='metrics'),
     path('export/', views.export_calls, name='export_calls'),
+    path('taches/<int:job_id>/', views.job_detail, name='job_detail'),
+    path('taches/<int:job_id>/telecharger/', views.job_download, name='job_download'),
+    path('api/jobs/<int:job_id>/', views.job_status, name='job_status'),
 ]
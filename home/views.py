@@ -1,68 +1,38 @@
-import csv
-import base64
-import json
-from io import StringIO
+import os
+import uuid
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, get_user_model
-from django.core.files.base import ContentFile
-from django.core.paginator import Paginator
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from django.db.models import Count
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.db.models import Exists, OuterRef, Prefetch, Q, Subquery
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseNotModified,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import urlencode
 from django.utils.text import slugify
-from django.views.decorators.http import require_POST
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_GET, require_POST
 
+from . import audit, changes, claims, events, exports, importer, jobs, metrics as runtime_metrics, recordings, serving, stats, xlsx
 from .forms import CallRecordForm, ImportCompaniesForm
-from .models import AuditLog, CallRecord, Company, SessionSnapshot
-
-
-def _user_cards():
-    User = get_user_model()
-    users = list(User.objects.all().order_by("username"))
-    stats = {}
-    calls = CallRecord.objects.select_related("user")
-    for call in calls:
-        if not call.user_id:
-            continue
-        stat = stats.setdefault(call.user_id, {"total": 0, "complete": 0, "incomplete": 0, "points": 0})
-        stat["total"] += 1
-        is_complete = (
-            call.call_status == "accepted"
-            and call.presentation_level
-            and call.questions_libres_level
-            and call.questions_orientees_level
-        )
-        if is_complete:
-            stat["complete"] += 1
-            stat["points"] += 2
-        else:
-            stat["incomplete"] += 1
-            stat["points"] += 1
-
-    max_points = max([s["points"] for s in stats.values()] or [1])
-    user_cards = []
-    for u in users:
-        stat = stats.get(u.id, {"total": 0, "complete": 0, "incomplete": 0, "points": 0})
-        points = stat["points"]
-        user_cards.append(
-            {
-                "username": u.get_username(),
-                "initial": (u.get_username()[:1] or "U").upper(),
-                "total": stat["total"],
-                "complete": stat["complete"],
-                "incomplete": stat["incomplete"],
-                "points": points,
-                "ratio": int((points / max_points) * 100) if max_points else 0,
-            }
-        )
-    user_cards.sort(key=lambda x: x["username"].lower())
-    return user_cards
-
+from .models import AuditLog, BackgroundJob, CallRecord, Company, CompanyImport, Recording, SessionSnapshot
+from .pagination import keyset_page
+from .phones import normalize_phone
+from .storage import private_storage
 
 
 def _format_dt(dt):
@@ -92,35 +62,29 @@ def _format_duration(seconds: float | int | None) -> str:
 
 def _user_presence_rows():
     # Utilisateurs et statut (en ligne, activite, action, duree)
+    # Dernière action / session par utilisateur via index (user, date) : O(utilisateurs)
     User = get_user_model()
-    users = list(User.objects.all().order_by("username"))
     now = timezone.now()
     active_cutoff = now - timezone.timedelta(minutes=5)
-
-    sessions = list(SessionSnapshot.objects.select_related("user").order_by("-last_activity"))
-    sessions_by_user = {}
-    for snap in sessions:
-        if not snap.user_id:
-            continue
-        sessions_by_user.setdefault(snap.user_id, []).append(snap)
-
-    logs = AuditLog.objects.filter(user__isnull=False).order_by("-created_at")
-    last_action_map = {}
-    for log in logs:
-        if log.user_id not in last_action_map:
-            last_action_map[log.user_id] = log
-        if len(last_action_map) == len(users):
-            break
+    users = list(
+        User.objects.annotate(
+            last_action_id=Subquery(
+                AuditLog.objects.filter(user=OuterRef("pk")).order_by("-created_at").values("id")[:1]
+            ),
+            last_session_id=Subquery(
+                SessionSnapshot.objects.filter(user=OuterRef("pk")).order_by("-last_activity").values("id")[:1]
+            ),
+            is_online=Exists(
+                SessionSnapshot.objects.filter(user=OuterRef("pk"), is_active=True, last_activity__gte=active_cutoff)
+            ),
+        ).order_by("username")
+    )
+    actions = AuditLog.objects.in_bulk([u.last_action_id for u in users if u.last_action_id])
+    sessions = SessionSnapshot.objects.in_bulk([u.last_session_id for u in users if u.last_session_id])
 
     rows = []
     for u in users:
-        user_sessions = sessions_by_user.get(u.id, [])
-        last_session = user_sessions[0] if user_sessions else None
-        active_session = next(
-            (s for s in user_sessions if s.is_active and s.last_activity and s.last_activity >= active_cutoff),
-            None,
-        )
-        online = active_session is not None
+        last_session = sessions.get(u.last_session_id)
         last_login = last_session.login_at if last_session else u.last_login
         last_activity = last_session.last_activity if last_session else u.last_login
         duration_seconds = 0
@@ -128,11 +92,11 @@ def _user_presence_rows():
             end_point = last_session.last_activity or last_session.login_at
             duration_seconds = max(0, (end_point - last_session.login_at).total_seconds())
 
-        last_action = last_action_map.get(u.id)
+        last_action = actions.get(u.last_action_id)
         rows.append(
             {
                 "username": u.get_username(),
-                "is_online": online,
+                "is_online": u.is_online,
                 "last_login_display": _format_dt(last_login) if last_login else "Jamais",
                 "last_activity_display": _format_dt(last_activity) if last_activity else "Jamais",
                 "last_action": f"{last_action.method} {last_action.path}" if last_action else "Aucune action",
@@ -150,6 +114,11 @@ def _require_access(request: HttpRequest) -> bool:
     return True
 
 
+def _wants_json(request: HttpRequest) -> bool:
+    """Requête fetch explicite (``Accept: application/json``) ; un envoi de formulaire classique envoie ``*/*``."""
+    return "application/json" in request.headers.get("Accept", "")
+
+
 def _ensure_seed_data() -> None:
     if Company.objects.exists():
         return
@@ -168,7 +137,7 @@ def _ensure_seed_data() -> None:
 
 def home(request: HttpRequest) -> HttpResponse:
     """Landing page."""
-    user_cards = _user_cards()
+    user_cards = stats.user_cards()
     return render(request, "home/index.html", {"user_cards": user_cards})
 
 
@@ -177,41 +146,8 @@ def dashboard(request: HttpRequest) -> HttpResponse:
     user_presence = _user_presence_rows()
     online_count = sum(1 for row in user_presence if row.get("is_online"))
     offline_count = max(0, len(user_presence) - online_count)
-    total_companies = Company.objects.count()
-    status_counts = Company.objects.values("status").annotate(total=Count("id"))
-    status_map = {row["status"]: row["total"] for row in status_counts}
-    success_calls = CallRecord.objects.filter(call_status="accepted")
-    calls_by_status = success_calls.values("status_numero").annotate(total=Count("id"))
-    answered = sum(row["total"] for row in calls_by_status if row["status_numero"] == "answered")
-    product_counts = (
-        success_calls.values("company__product")
-        .annotate(total=Count("id"))
-        .order_by("company__product")
-    )
-    calls_with_audio = success_calls.filter(recordings__isnull=False).distinct().count()
-    calls_without_audio = success_calls.filter(recordings__isnull=True).count()
-    enquete_map = {}
-    for call in success_calls.select_related("company"):
-        product = call.company.product or "Non renseigné"
-        status = call.enquete_status()
-        bucket = enquete_map.setdefault(product, {"Complet": 0, "Partiel": 0, "Incomplet": 0})
-        bucket[status] = bucket.get(status, 0) + 1
-    enquete_by_product = [
-        {"product": prod, **stats} for prod, stats in sorted(enquete_map.items(), key=lambda x: x[0].lower())
-    ]
-
     context = {
-        "total_companies": total_companies,
-        "pending": status_map.get("pending", 0),
-        "in_progress": status_map.get("in_progress", 0),
-        "done": status_map.get("done", 0),
-        "calls_total": success_calls.count(),
-        "calls_answered": answered,
-        "calls_by_status": calls_by_status,
-        "product_counts": product_counts,
-        "calls_with_audio": calls_with_audio,
-        "calls_without_audio": calls_without_audio,
-        "enquete_by_product": enquete_by_product,
+        **stats.dashboard_stats(),
         "user_presence": user_presence,
         "online_count": online_count,
         "offline_count": offline_count,
@@ -251,137 +187,212 @@ def call_list(request: HttpRequest) -> HttpResponse:
     if not _require_access(request):
         return redirect("call_access")
     _ensure_seed_data()
-    companies = list(Company.objects.all().order_by("status", "name"))
-    latest_call = {}
-    for call in (
-        CallRecord.objects.select_related("company", "user")
-        .prefetch_related("recordings")
-        .order_by("-created_at")
-    ):
-        if call.company_id in latest_call:
-            continue
-        latest_call[call.company_id] = call
+    claims.sweep_if_due()
+    status_cursor = changes.current_seq()
+    search = request.GET.get("q", "").strip()
+    product = request.GET.get("product", "").strip()
+
+    companies = Company.objects.all()
+    if search:
+        companies = companies.filter(
+            Q(name__icontains=search)
+            | Q(activity__icontains=search)
+            | Q(phone__icontains=search)
+            | Q(product__icontains=search)
+        )
+    if product:
+        companies = companies.filter(product=product)
+    # Seules les 50 lignes affichées sont hydratées (dernier appel, inspecteur, enregistrement)
+    companies = companies.select_related("latest_call__user").prefetch_related(
+        Prefetch("latest_call__recordings", queryset=Recording.objects.order_by("-created_at"))
+    )
+    page_obj = keyset_page(
+        companies,
+        ["status", "name", "id"],
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+        page_size=50,
+    )
 
     call_rows = []
-    for c in companies:
-        call = latest_call.get(c.id)
-        rec = call.recordings.order_by("-created_at").first() if call else None
+    for c in page_obj.object_list:
+        call = c.latest_call
+        recordings = list(call.recordings.all()) if call else []
         inspector = call.user.get_username() if call and call.user else None
         enquete = call.enquete_status() if call else ""
-        call_rows.append({"company": c, "recording": rec, "inspector": inspector, "enquete": enquete})
+        call_rows.append({"company": c, "recording": recordings[0] if recordings else None, "inspector": inspector, "enquete": enquete})
+    page_obj.object_list = call_rows
+
+    products = (
+        Company.objects.exclude(product="").values_list("product", flat=True).distinct().order_by("product")
+    )
     welcome_user = request.session.pop("welcome_user", None)
-    paginator = Paginator(call_rows, 50)
-    page_number = request.GET.get("page") or 1
-    page_obj = paginator.get_page(page_number)
     return render(
         request,
         "home/call_list.html",
-        {"page_obj": page_obj, "welcome_user": welcome_user},
+        {
+            "page_obj": page_obj,
+            "welcome_user": welcome_user,
+            "status_cursor": status_cursor,
+            "search": search,
+            "product": product,
+            "products": products,
+            "filter_query": urlencode({k: v for k, v in (("q", search), ("product", product)) if v}),
+        },
     )
 
 
 def company_statuses(request: HttpRequest) -> JsonResponse:
-    """AJAX: retourne les statuts/inspecteurs par entreprise."""
-    companies = list(Company.objects.all().order_by("id"))
-    latest_call = {}
-    for call in (
-        CallRecord.objects.select_related("company", "user")
-        .order_by("-created_at")
-    ):
-        if call.company_id in latest_call:
-            continue
-        latest_call[call.company_id] = call
-
-    payload = []
-    for c in companies:
-        call = latest_call.get(c.id)
-        inspector = call.user.get_username() if call and call.user else None
-        payload.append(
+    """
+    AJAX: retourne les statuts/inspecteurs par entreprise.
+
+    Avec ``?since=<curseur>``, seules les entreprises modifiées depuis ce
+    curseur sont renvoyées ; 304 si rien n'a changé (ETag ou curseur à jour).
+    """
+    # Les baux expirés reviennent dans la liste sans attendre la page d'appel
+    claims.sweep_if_due()
+    cursor = changes.current_seq()
+    etag = f'"companies-{cursor}"'
+    try:
+        since = int(request.GET["since"])
+    except (KeyError, ValueError):
+        since = None
+    if request.headers.get("If-None-Match") == etag or (since is not None and since >= cursor):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    payload = changes.company_status_rows(since)
+    response = JsonResponse({"cursor": cursor, "full": since is None, "companies": payload})
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def _phone_matches(phone_key: str, exclude_id=None, limit: int = 10) -> list[dict]:
+    """Entreprises partageant ce téléphone normalisé, avec leur dernier appel."""
+    if not phone_key:
+        return []
+    companies = Company.objects.filter(phone_key=phone_key).select_related("latest_call__user").order_by("id")
+    if exclude_id is not None:
+        companies = companies.exclude(id=exclude_id)
+    rows = []
+    for c in companies[:limit]:
+        call = c.latest_call
+        rows.append(
             {
                 "id": c.id,
+                "name": c.name,
+                "phone": c.phone,
                 "status": c.status,
-                "status_display": c.get_status_display(),
-                "inspector": inspector,
+                "status_label": c.get_status_display(),
+                "last_call_at": _format_dt(call.created_at) if call else "",
+                "last_agent": call.user.get_username() if call and call.user else "",
+                "last_call_status": (call.get_call_status_display() or call.get_status_numero_display()) if call else "",
             }
         )
-    return JsonResponse({"companies": payload})
+    return rows
+
+
+def phone_lookup(request: HttpRequest) -> JsonResponse:
+    """AJAX: entreprises portant ce numéro (``?phone=``, comparé sous forme normalisée)."""
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "forbidden"}, status=403)
+    phone_key = normalize_phone(request.GET.get("phone", ""))
+    try:
+        exclude_id = int(request.GET["exclude"])
+    except (KeyError, ValueError):
+        exclude_id = None
+    return JsonResponse({"phone_key": phone_key, "companies": _phone_matches(phone_key, exclude_id)})
 
 
 def user_stats(request: HttpRequest) -> JsonResponse:
     """AJAX: stats utilisateurs (points, complet/incomplet)."""
-    return JsonResponse({"users": _user_cards()})
+    return JsonResponse({"users": stats.user_cards()})
 
 
-def export_calls(request: HttpRequest) -> HttpResponse:
-    """Affiche/exporte tous les appels."""
-    records = (
-        CallRecord.objects.select_related("company", "user")
-        .prefetch_related("recordings")
-        .order_by("-created_at")
-    )
+async def live_events(request: HttpRequest) -> HttpResponse:
+    """SSE: statuts des entreprises et classement poussés en direct (serveur ASGI requis)."""
+    if not getattr(settings, "EVENTS_SSE_ENABLED", True) or not isinstance(request, ASGIRequest):
+        # 204 : EventSource abandonne et la page revient au polling
+        return HttpResponse(status=204)
+    topics = {t for t in request.GET.get("topics", "companies").split(",") if t in events.TOPICS}
+    if not topics:
+        return HttpResponse(status=204)
+    try:
+        since = int(request.GET["since"])
+    except (KeyError, ValueError):
+        since = None
+    heartbeat = getattr(settings, "EVENTS_HEARTBEAT_SECONDS", 15)
+    response = StreamingHttpResponse(events.stream(topics, since, heartbeat), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
-    rows = []
-    for call in records:
-        c = call.company
-        has_audio = call.recordings.exists()
-        enquete = call.enquete_status()
-        rows.append(
-            [
-                c.name,
-                c.phone,
-                c.product,
-                c.activity,
-                c.location,
-                c.legal_form,
-                c.niu,
-                c.validity_score,
-                call.get_status_numero_display(),
-                call.get_call_status_display() if call.call_status else "",
-                call.get_presentation_level_display() if call.presentation_level else "",
-                call.get_questions_libres_level_display() if call.questions_libres_level else "",
-                call.get_questions_orientees_level_display() if call.questions_orientees_level else "",
-                enquete,
-                (call.status_marked_at or call.created_at).strftime("%Y-%m-%d %H:%M"),
-                "Oui" if has_audio else "Non",
-            ]
-        )
 
-    if request.method == "POST" and request.POST.get("action") == "export":
-        fmt = request.POST.get("format", "csv")
+def metrics(request: HttpRequest) -> JsonResponse:
+    """AJAX: compteurs de fonctionnement du processus (réservé au staff)."""
+    if not request.user.is_staff:
+        return JsonResponse({"error": "forbidden"}, status=403)
+    values = runtime_metrics.snapshot()
+    values["audit.queue_size"] = audit.get_writer().qsize()
+    return JsonResponse({"pid": os.getpid(), "metrics": values})
+
+
+def export_calls(request: HttpRequest) -> HttpResponse:
+    """
+    Aperçu paginé et filtré des appels ; export en CSV/XLSX.
+
+    L'export (``action=export``) accepte les mêmes filtres que l'aperçu et
+    ``since``. En POST (page) il part en tâche de fond ; en GET (extractions
+    automatiques) il est envoyé en flux et l'en-tête ``X-Export-Cursor``
+    donne le ``since`` suivant.
+    """
+    params = request.POST if request.method == "POST" else request.GET
+    if params.get("action") == "export":
+        fmt = params.get("format", "csv")
         today = timezone.now().strftime("%Y%m%d")
         filename = f"PME_Transformation_consolidee_{today}"
-        header = [
-            "Nom de l'entreprise", "Téléphone", "Produit", "Activité", "Localisation",
-            "Régime/Forme", "NIU", "Validité score", "Statut numéros", "Statut appel",
-            "Présentation", "Questions libres", "Questions orientées", "Enquête",
-            "Date-temps", "Enregistrement vocal",
-        ]
+        if request.method == "POST":
+            # Export depuis la page : fichier produit par le worker, téléchargeable ensuite
+            job_params = {key: params.get(key, "") for key in ("format", "since", *exports.FILTER_PARAMS)}
+            return _start_job(request, "export", {**job_params, "filename": filename})
+        queryset, cursor = exports.export_snapshot(exports.read_filters(params), exports.read_since(params))
         if fmt == "excel":
-            import csv
-            import io
-
-            buffer = io.StringIO(newline="")
-            writer = csv.writer(buffer, delimiter="\t")
-            writer.writerow(header)
-            writer.writerows(rows)
-            data = buffer.getvalue().encode("utf-8")
-            resp = HttpResponse(data, content_type="application/vnd.ms-excel")
-            resp["Content-Disposition"] = f'attachment; filename="{filename}.xlsm"'
-            return resp
+            resp = StreamingHttpResponse(exports.iter_xlsx(exports.iter_rows(queryset)), content_type=xlsx.CONTENT_TYPE)
+            resp["Content-Disposition"] = f'attachment; filename="{filename}.xlsx"'
         else:
-            import csv
-            import io
-
-            buffer = io.StringIO(newline="")
-            writer = csv.writer(buffer)
-            writer.writerow(header)
-            writer.writerows(rows)
-            data = buffer.getvalue().encode("utf-8")
-            resp = HttpResponse(data, content_type="text/csv; charset=utf-8")
+            resp = StreamingHttpResponse(
+                exports.iter_delimited(exports.iter_rows(queryset)),
+                content_type="text/csv; charset=utf-8",
+            )
             resp["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
-            return resp
-
-    return render(request, "home/export.html", {"rows": rows})
+        resp["X-Export-Cursor"] = str(cursor)
+        return resp
+
+    # Aperçu : une page filtrée côté serveur ; l'export complet passe uniquement par le téléchargement
+    filters = exports.read_filters(request.GET)
+    page_obj = keyset_page(
+        exports.filter_calls(exports.export_queryset(), filters),
+        ["-created_at", "-id"],
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+        page_size=100,
+    )
+    page_obj.object_list = [exports.export_row(call) for call in page_obj.object_list]
+    User = get_user_model()
+    return render(
+        request,
+        "home/export.html",
+        {
+            "page_obj": page_obj,
+            "filters": filters,
+            "agents": User.objects.order_by("username").only("id", "username"),
+            "products": Company.objects.exclude(product="").values_list("product", flat=True).distinct().order_by("product"),
+            "statuses": CallRecord.CALL_STATUS_CHOICES,
+            "filter_query": urlencode(filters),
+        },
+    )
 
 
 def call_form(request: HttpRequest, company_id: int) -> HttpResponse:
@@ -393,9 +404,19 @@ def call_form(request: HttpRequest, company_id: int) -> HttpResponse:
         messages.info(request, "Cette entreprise est déjà marquée comme appelée.")
         return redirect("call_list")
 
-    if company.status != "in_progress":
-        company.status = "in_progress"
-        company.save(update_fields=["status"])
+    # Réservation atomique (bail renouvelé par la page, voir claims.py)
+    if not claims.claim(company.id, request.user):
+        company = Company.objects.select_related("claimed_by").get(id=company.id)
+        if company.status == "done":
+            text = "Cette entreprise est déjà marquée comme appelée."
+        else:
+            holder = company.claimed_by.username if company.claimed_by else "Un autre agent"
+            text = f"{holder} a déjà ouvert cette entreprise."
+        if request.method == "POST" and _wants_json(request):
+            return JsonResponse({"errors": {"__all__": [text]}}, status=409)
+        messages.warning(request, text)
+        return redirect("call_list")
+    company.refresh_from_db()
 
     initial = {}
     if request.method == "POST":
@@ -407,11 +428,6 @@ def call_form(request: HttpRequest, company_id: int) -> HttpResponse:
                 record.user = request.user
             record.questionnaire_data = form.cleaned_data.get("questionnaire_data") or {}
             call_status = form.cleaned_data.get("call_status")
-            if call_status == "callback":
-                company.status = "callback"
-            else:
-                company.status = "done"
-            company.save(update_fields=["status"])
             ts_val = form.cleaned_data.get("status_marked_at")
             if ts_val:
                 try:
@@ -425,25 +441,25 @@ def call_form(request: HttpRequest, company_id: int) -> HttpResponse:
                 record.status_marked_at = timezone.now()
             record.recording_started_at = timezone.now()
             record.recording_stopped_at = timezone.now()
-            record.save()
-            recording_data = form.cleaned_data.get("recording_data")
-            if recording_data:
-                try:
-                    header, data = recording_data.split(",", 1)
-                    mime = form.cleaned_data.get("recording_mime") or header.split(";")[0].replace("data:", "")
-                    ext = "webm"
-                    if "mp4" in mime:
-                        ext = "mp4"
-                    company_slug = slugify(company.name) or "entreprise"
-                    date_str = timezone.now().strftime("%Y%m%d")
-                    audio_bytes = ContentFile(base64.b64decode(data), name=f"{company_slug}_{date_str}.{ext}")
-                    from .models import Recording
-
-                    Recording.objects.create(call=record, file=audio_bytes, mime_type=mime, duration_seconds=0)
-                except Exception:
-                    messages.warning(request, "Impossible d'enregistrer le fichier audio.")
+            with transaction.atomic():
+                record.save()
+                # Statut et inspecteur changent ensemble : un seul numéro de modification
+                changes.save_status(company, "callback" if call_status == "callback" else "done", latest_call=record)
+                stats.record_call(record)
+                changes.next_seq(changes.CALLS)
             messages.success(request, "Enregistrement sauvegarde.")
+            if _wants_json(request):
+                # Formulaire envoyé en fetch : l'audio suit sur upload_recording
+                return JsonResponse(
+                    {
+                        "call": record.id,
+                        "upload_url": reverse("upload_recording", args=[record.id]),
+                        "redirect": reverse("call_list"),
+                    }
+                )
             return redirect(reverse("call_list"))
+        if _wants_json(request):
+            return JsonResponse({"errors": form.errors}, status=400)
     else:
         form = CallRecordForm(initial=initial)
 
@@ -453,141 +469,237 @@ def call_form(request: HttpRequest, company_id: int) -> HttpResponse:
         {
             "company": company,
             "form": form,
+            "claim_renew_ms": claims.lease_seconds() * 1000 // 3,
+            "phone_matches": _phone_matches(company.phone_key, exclude_id=company.id),
         },
     )
 
 
-def import_companies(request: HttpRequest) -> HttpResponse:
-    form = ImportCompaniesForm()
-    imported = 0
-    preview_rows = []
-    payload_json = ""
-    session_key = "import_preview_rows"
-
-    def parse_csv(uploaded_file):
-        raw_bytes = uploaded_file.read()
-        try:
-            data = raw_bytes.decode("utf-8-sig")
-        except UnicodeDecodeError:
-            try:
-                data = raw_bytes.decode("latin-1")
-            except UnicodeDecodeError:
-                raise ValueError("Impossible de lire le fichier CSV.")
-
-        sample_lines = [line for line in data.splitlines() if line.strip()][:5]
-        delimiter = ","
-        if sample_lines:
-            comma_score = sum(line.count(",") for line in sample_lines)
-            semicolon_score = sum(line.count(";") for line in sample_lines)
-            delimiter = ";" if semicolon_score > comma_score else ","
-
-        try:
-            has_header = csv.Sniffer().has_header("\n".join(sample_lines)) if sample_lines else True
-        except Exception:
-            has_header = True
-
-        def pick(row_obj, keys, fallback_index=None):
-            if isinstance(row_obj, dict):
-                for k in keys:
-                    if k in row_obj and row_obj[k] not in (None, ""):
-                        return row_obj[k]
-            else:
-                if fallback_index is not None and fallback_index < len(row_obj):
-                    return row_obj[fallback_index]
-            return ""
+RECORDING_EXTENSIONS = {"audio/mp4": "mp4", "audio/mpeg": "mp3", "audio/ogg": "ogg", "audio/wav": "wav"}
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
-        def trim(val, limit=255):
-            return str(val)[:limit] if val is not None else ""
 
-        rows_iter = (
-            csv.DictReader(StringIO(data), delimiter=delimiter)
-            if has_header
-            else csv.reader(StringIO(data), delimiter=delimiter)
-        )
+def _recording_name(company: Company, mime: str) -> str:
+    ext = RECORDING_EXTENSIONS.get(mime.split(";")[0].strip(), "webm")
+    company_slug = slugify(company.name) or "entreprise"
+    return f"{company_slug}_{timezone.now().strftime('%Y%m%d')}.{ext}"
+
+
+def _spool_body(request: HttpRequest, max_bytes: int) -> TemporaryUploadedFile | None:
+    """Copie un corps ``application/octet-stream`` sur disque par blocs ; None si ``max_bytes`` est dépassé."""
+    upload = TemporaryUploadedFile("recording", request.content_type, 0, None)
+    size = 0
+    while True:
+        chunk = request.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            upload.close()
+            return None
+        upload.write(chunk)
+    upload.size = size
+    upload.seek(0)
+    return upload
+
+
+@csrf_exempt
+def upload_recording(request: HttpRequest, call_id: int) -> JsonResponse:
+    """
+    Audio d'un appel, envoyé après le formulaire : ``multipart/form-data`` (champ
+    ``file``) ou corps ``application/octet-stream``. Le fichier transite par un
+    fichier temporaire puis est déplacé dans MEDIA_ROOT : la mémoire utilisée ne
+    dépend pas de la durée de l'appel.
+    """
+    # Avant toute lecture du corps (le contrôle CSRF lirait request.POST)
+    request.upload_handlers = [TemporaryFileUploadHandler(request)]
+    return _upload_recording(request, call_id)
+
+
+@csrf_protect
+@require_POST
+def _upload_recording(request: HttpRequest, call_id: int) -> JsonResponse:
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "forbidden"}, status=403)
+    call = get_object_or_404(CallRecord.objects.select_related("company"), id=call_id)
+    if call.user_id != request.user.id and not request.user.is_staff:
+        return JsonResponse({"error": "forbidden"}, status=403)
+    max_bytes = getattr(settings, "RECORDING_MAX_UPLOAD_MB", 200) * 1024 * 1024
+    if int(request.META.get("CONTENT_LENGTH") or 0) > max_bytes:
+        return JsonResponse({"error": "too_large"}, status=413)
+
+    if request.content_type == "multipart/form-data":
+        upload = request.FILES.get("file")
+        mime = request.POST.get("mime") or (upload.content_type if upload else "")
+    elif request.content_type == "application/octet-stream":
+        upload = _spool_body(request, max_bytes)
+        if upload is None:
+            return JsonResponse({"error": "too_large"}, status=413)
+        mime = request.GET.get("mime", "")
+    else:
+        return JsonResponse({"error": "unsupported_media_type"}, status=415)
+    if upload is None or not upload.size:
+        return JsonResponse({"error": "empty"}, status=400)
 
-        parsed = []
-        for idx, row in enumerate(rows_iter, start=1):
-            name_val = pick(row, ["name", "Name", "nom", "Nom"], fallback_index=0)
-            phone_val = pick(row, ["phone", "Phone", "tel", "Tel","Telephone","Téléphone"], fallback_index=1)
-            product_val = pick(row, ["product", "Product", "filiere","Produit","produit","filières"], fallback_index=2)
-            activity_val = pick(row, ["activity", "Activity","Activité"], fallback_index=3)
-            location_val = pick(row, ["location", "Location","Localisation"], fallback_index=4)
-            legal_form_val = pick(row, ["legal_form", "Legal_form", "forme"], fallback_index=5)
-            niu_val = pick(row, ["niu", "NIU"], fallback_index=6)
-            validity_val = pick(row, ["validity_score", "score"], fallback_index=7)
-            status_val = pick(row, ["status", "etat"], fallback_index=8)
-
-            name = trim(name_val) or f"Entreprise {idx}"
-            phone = trim(phone_val) or "Non renseigne"
-            try:
-                validity_score = float(validity_val) if validity_val not in ("", None) else 0
-            except ValueError:
-                validity_score = 0
-            status = trim(status_val) or "pending"
-            if status not in dict(Company.STATUS_CHOICES):
-                status = "pending"
-
-            parsed.append(
-                {
-                    "name": trim(name),
-                    "phone": trim(phone),
-                    "product": trim(product_val),
-                    "activity": trim(activity_val),
-                    "location": trim(location_val),
-                    "legal_form": trim(legal_form_val),
-                    "niu": trim(niu_val),
-                    "validity_score": validity_score,
-                    "status": status,
-                }
+    mime = mime or "audio/webm"
+    upload.name = _recording_name(call.company, mime)
+    try:
+        recording = Recording.objects.create(call=call, file=upload, mime_type=mime, duration_seconds=0)
+    finally:
+        upload.close()
+    changes.next_seq(changes.CALLS)
+    # Conversion et durée réelle par le worker (recordings.py)
+    jobs.enqueue_once("recordings", user=request.user)
+    return JsonResponse(
+        {"id": recording.id, "url": reverse("recording_file", args=[recording.id]), "size": recording.file.size},
+        status=201,
+    )
+
+
+@require_GET
+def recording_file(request: HttpRequest, recording_id: int) -> HttpResponse:
+    """Audio d'un appel pour les agents connectés (Range/206, ETag ; voir serving.py)."""
+    if not request.user.is_authenticated:
+        return HttpResponse(status=403)
+    recording = get_object_or_404(Recording.objects.only("file", "mime_type"), id=recording_id)
+    if not recording.file:
+        raise Http404
+    return serving.serve_file(request, recording.file, recording.mime_type or "application/octet-stream")
+
+
+@require_GET
+def recording_peaks(request: HttpRequest, recording_id: int) -> HttpResponse:
+    """
+    Forme d'onde précalculée (recordings.py) : binaire par défaut (un octet
+    0-255 par pic, en-tête ``X-Peaks-Per-Second``), JSON avec ``?format=json``.
+    ``?n=`` réduit au nombre de pics affichables. 404 tant qu'elle n'est pas prête.
+    """
+    if not request.user.is_authenticated:
+        return HttpResponse(status=403)
+    recording = get_object_or_404(Recording.objects.only("file", "content_hash", "duration_seconds"), id=recording_id)
+    loaded = recordings.load_peaks(recording) if recording.file else None
+    if loaded is None:
+        raise Http404
+    per_second, full = loaded
+    try:
+        count = int(request.GET.get("n", 0))
+    except ValueError:
+        count = 0
+    peaks = recordings.downsample(full, count) if count else full
+    rate = per_second * len(peaks) / len(full) if full else per_second
+    etag = f'"{recording.content_hash or recording.file.name}-{per_second}-{count}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if request.GET.get("format") == "json":
+            response = JsonResponse(
+                {"peaks_per_second": rate, "duration": recording.duration_seconds, "peaks": list(peaks)}
             )
-        return parsed
+        else:
+            response = HttpResponse(peaks, content_type="application/octet-stream")
+            response["X-Peaks-Per-Second"] = f"{rate:g}"
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def import_companies(request: HttpRequest) -> HttpResponse:
+    """Import CSV : préparation puis fusion/remplacement, chacun en tâche de fond (voir jobs.py)."""
+    form = ImportCompaniesForm()
+    batch = None
+    preview_rows = []
+    duplicate_rows = []
+    session_key = "import_batch_id"
 
     if request.method == "POST":
         action = request.POST.get("action")
         if action == "confirm":
-            payload_json = request.POST.get("payload", "[]")
-            try:
-                rows = json.loads(payload_json)
-            except json.JSONDecodeError:
-                rows = request.session.get(session_key, [])
-            if not rows:
+            batch_id = request.POST.get("batch", "")
+            # Seul l'import préparé dans cette session peut être confirmé
+            if not batch_id.isdigit() or int(batch_id) != request.session.get(session_key):
+                batch_id = None
+            batch = CompanyImport.objects.filter(id=batch_id).first() if batch_id else None
+            if batch is None or not batch.row_count:
                 messages.error(request, "Aucune donnee a enregistrer.")
                 return redirect("import_companies")
-            with transaction.atomic():
-                Company.objects.all().delete()
-                to_create = [Company(**row) for row in rows]
-                Company.objects.bulk_create(to_create)
             request.session.pop(session_key, None)
-            imported = len(rows)
-            messages.success(request, f"{imported} entreprises enregistrees (ancienne base remplacee).")
-            return redirect("contacts")
+            mode = "replace" if request.POST.get("mode") == "replace" else "merge"
+            return _start_job(request, "import_apply", {"batch": batch.id, "mode": mode})
         else:
             form = ImportCompaniesForm(request.POST, request.FILES)
             if form.is_valid():
                 upload = form.cleaned_data["file"]
-                try:
-                    preview_rows = parse_csv(upload)
-                    payload_json = json.dumps(preview_rows)
-                    request.session[session_key] = preview_rows
-                    if not preview_rows:
-                        messages.info(request, "Aucune ligne trouvee dans le CSV.")
-                except ValueError as exc:
-                    messages.error(request, str(exc))
-            else:
-                messages.error(request, "Fichier invalide.")
+                path = private_storage.save(f"jobs/uploads/{uuid.uuid4().hex}.csv", upload)
+                return _start_job(request, "import_stage", {"upload": path, "filename": upload.name})
+            messages.error(request, "Fichier invalide.")
+    elif request.GET.get("job", "").isdigit():
+        # Retour de la préparation : aperçu des premières lignes
+        job = _get_job(request, int(request.GET["job"]))
+        if job.kind == "import_stage" and job.status == "done":
+            batch = CompanyImport.objects.filter(id=job.result.get("batch")).first()
+        if batch is not None:
+            request.session[session_key] = batch.id
+            preview_rows = importer.preview_rows(batch, getattr(settings, "IMPORT_PREVIEW_ROWS", 50))
+            duplicate_rows = importer.duplicate_rows(batch, 20)
+            if not batch.row_count:
+                messages.info(request, "Aucune ligne trouvee dans le CSV.")
+        else:
+            messages.error(request, "Import introuvable ou expire.")
 
     return render(
         request,
         "home/import_companies.html",
-        {"form": form, "imported": imported, "preview_rows": preview_rows, "payload_json": payload_json},
+        {"form": form, "batch": batch, "preview_rows": preview_rows, "duplicate_rows": duplicate_rows},
     )
 
 
+def _start_job(request: HttpRequest, kind: str, params: dict) -> HttpResponse:
+    job = jobs.enqueue(kind, params, user=request.user)
+    # Les tâches lancées depuis cette session restent consultables sans compte
+    request.session["jobs"] = (request.session.get("jobs", []) + [job.id])[-20:]
+    return redirect("job_detail", job_id=job.id)
+
+
+def _get_job(request: HttpRequest, job_id: int) -> BackgroundJob:
+    job = get_object_or_404(BackgroundJob, id=job_id)
+    owner = job.user_id is not None and job.user_id == request.user.id
+    if not (request.user.is_staff or owner or job.id in request.session.get("jobs", [])):
+        raise Http404
+    return job
+
+
+def job_detail(request: HttpRequest, job_id: int) -> HttpResponse:
+    job = _get_job(request, job_id)
+    return render(request, "home/job_status.html", {"job": job, "job_data": jobs.as_dict(job)})
+
+
+def job_status(request: HttpRequest, job_id: int) -> JsonResponse:
+    """AJAX: avancement d'une tâche de fond."""
+    return JsonResponse(jobs.as_dict(_get_job(request, job_id)))
+
+
+def job_download(request: HttpRequest, job_id: int) -> HttpResponse:
+    job = _get_job(request, job_id)
+    if job.status != "done" or not job.result_file:
+        raise Http404
+    return FileResponse(job.result_file.open("rb"), as_attachment=True, filename=job.result.get("filename"))
+
+
+@require_POST
+def claim_company(request: HttpRequest, company_id: int) -> JsonResponse:
+    """Renouvelle le bail de l'agent sur la fiche ouverte (appelé périodiquement par call_form)."""
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "forbidden"}, status=403)
+    get_object_or_404(Company.objects.only("id"), id=company_id)
+    claimed = claims.claim(company_id, request.user)
+    return JsonResponse({"claimed": claimed, "lease_seconds": claims.lease_seconds()}, status=200 if claimed else 409)
+
+
 @require_POST
 def reset_company_status(request: HttpRequest, company_id: int) -> JsonResponse:
-    """Réinitialise un statut en cours vers pending si aucun enregistrement n'a été validé."""
+    """Rend la fiche à son statut précédent si l'agent la détient encore et n'a rien validé."""
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "forbidden"}, status=403)
     company = get_object_or_404(Company, id=company_id)
-    if company.status == "in_progress":
-        company.status = "pending"
-        company.save(update_fields=["status"])
+    if claims.release(company.id, request.user):
+        company.refresh_from_db(fields=["status"])
     return JsonResponse({"status": company.status})